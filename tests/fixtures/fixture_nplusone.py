@@ -0,0 +1,8 @@
+import pytest
+from core.nplusone import detect_n_plus_one
+
+
+@pytest.fixture(autouse=True)
+def n_plus_one():
+    with detect_n_plus_one(mode='raise') as tracker:
+        yield tracker
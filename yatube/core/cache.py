@@ -0,0 +1,90 @@
+from functools import wraps
+from math import log
+from random import random
+from time import sleep, time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+LOCK_KEY = 'lock:{}'
+
+
+def cache_is_shared(alias='default'):
+    """Видят ли записи кеша другие процессы: LocMem и Dummy живут
+    внутри одного воркера."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def is_fresh(expires, delta, now):
+    """Вероятностное раннее истечение (XFetch).
+
+    Чем ближе срок и чем дольше пересчет (delta), тем вероятнее, что
+    запрос решит обновить значение заранее, пока остальные отдают кеш.
+    """
+    beta = settings.STAMPEDE_BETA
+    return now - delta * beta * log(1 - random()) < expires
+
+
+def wait_for(key):
+    """Ждет, пока другой воркер положит значение, не дольше STAMPEDE_WAIT."""
+    deadline = time() + settings.STAMPEDE_WAIT
+    while time() < deadline:
+        sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_compute(key, compute, timeout):
+    """Значение из кеша с защитой от одновременного пересчета.
+
+    В кеше лежит (значение, срок, время пересчета) и живет еще
+    STAMPEDE_STALE_TIMEOUT после срока. Пересчитывает только тот, кто
+    взял блокировку, остальные отдают устаревшее значение; при пустом
+    кеше они недолго ждут результат, а потом считают сами.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if is_fresh(expires, delta, time()):
+            return value
+    lock = LOCK_KEY.format(key)
+    locked = cache.add(lock, 1, settings.STAMPEDE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = wait_for(key)
+        if entry is not None:
+            return entry[0]
+    try:
+        started = time()
+        value = compute()
+        finished = time()
+        cache.set(
+            key,
+            (value, finished + timeout, finished - started),
+            timeout + settings.STAMPEDE_STALE_TIMEOUT,
+        )
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
+
+
+def stampede_cached(key, timeout):
+    """Декоратор для данных представлений поверх get_or_compute.
+
+    key - шаблон ключа, в который подставляются аргументы функции.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_or_compute(
+                key.format(*args, **kwargs),
+                lambda: func(*args, **kwargs),
+                timeout,
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,9 @@
+from posts.feedstate import unseen_count
+
+
+def unseen_posts(request):
+    """Добавляет число новых постов в ленте подписок.
+
+    Значение вычисляется, только если шаблон к нему обращается.
+    """
+    return {'unseen_posts': lambda: unseen_count(request.user)}
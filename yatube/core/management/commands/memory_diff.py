@@ -0,0 +1,67 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.memtrack import (
+    latest_pair, snapshot_path, snapshot_pid, stored_snapshots
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает два снимка памяти, снятых через /memory/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=(
+                'Старый и новый снимок; по умолчанию два последних '
+                'снимка одного процесса'
+            ),
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Перечислить сохраненные снимки',
+        )
+        parser.add_argument(
+            '--group-by',
+            choices=('lineno', 'filename', 'traceback'),
+            default='lineno',
+            help='Группировка выделений',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько строк показать',
+        )
+
+    def handle(self, *args, **options):
+        stored = stored_snapshots()
+        if options['list']:
+            for name in stored:
+                self.stdout.write(name)
+            return
+        names = options['names'] or latest_pair()
+        if not names:
+            raise CommandError('Нет двух снимков одного процесса')
+        if len(names) != 2:
+            raise CommandError('Нужно два снимка: старый и новый')
+        missing = [name for name in names if name not in stored]
+        if missing:
+            raise CommandError(f"Снимок не найден: {', '.join(missing)}")
+        if snapshot_pid(names[0]) != snapshot_pid(names[1]):
+            raise CommandError(
+                'Снимки сняты в разных процессах: их память не сравнима'
+            )
+        old, new = (
+            tracemalloc.Snapshot.load(snapshot_path(name)) for name in names
+        )
+        stats = new.compare_to(old, options['group_by'])
+        growth = sum(stat.size_diff for stat in stats)
+        self.stdout.write(
+            f'{names[0]} -> {names[1]}: {growth / 1024:+.1f} КиБ'
+        )
+        for stat in stats[:options['limit']]:
+            self.stdout.write(str(stat))
@@ -0,0 +1,66 @@
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import (
+    collapsed_stacks, load_meta, print_top, profile_paths, stored_profiles
+)
+
+
+class Command(BaseCommand):
+    help = 'Показывает профили запросов, снятые ProfileMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'name',
+            nargs='?',
+            help='Имя профиля из X-Profile-Id; по умолчанию последний',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Перечислить сохраненные профили',
+        )
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            help='Ключ сортировки pstats: cumulative, tottime, ncalls...',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=30,
+            help='Сколько функций показать',
+        )
+        parser.add_argument(
+            '--collapsed',
+            metavar='FILE',
+            help='Записать свернутые стеки для flamegraph в файл',
+        )
+
+    def handle(self, *args, **options):
+        names = stored_profiles()
+        if options['list']:
+            for name in names:
+                meta = load_meta(name)
+                self.stdout.write(
+                    f"{name} {meta.get('seconds', '?')} с "
+                    f"{meta.get('method', '')} {meta.get('path', '')}"
+                )
+            return
+        name = options['name'] or (names[0] if names else None)
+        if name not in names:
+            raise CommandError(f'Профиль не найден: {name}')
+        meta = load_meta(name)
+        self.stdout.write(
+            f"{name}: {meta.get('method', '')} {meta.get('path', '')} "
+            f"{meta.get('status', '')} за {meta.get('seconds', '?')} с, "
+            f"{meta.get('user', '')}"
+        )
+        if options['collapsed']:
+            stats = pstats.Stats(profile_paths(name)[0])
+            with open(options['collapsed'], 'w') as out:
+                out.write('\n'.join(collapsed_stacks(stats)) + '\n')
+            self.stdout.write(f"Стеки записаны в {options['collapsed']}")
+            return
+        print_top(name, options['sort'], options['limit'], self.stdout)
@@ -0,0 +1,101 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replay import (
+    SAFE_METHODS, HTTPTarget, WSGITarget, read_log, replay, summarize
+)
+
+
+class Command(BaseCommand):
+    help = 'Проигрывает записанный лог запросов и меряет задержки'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'log',
+            help='JSON-строки с time, method, path, user или access-лог; '
+                 '"-" читает stdin',
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него запросы идут в '
+                 'yatube.wsgi.application этого процесса',
+        )
+        parser.add_argument(
+            '--app',
+            default='yatube.wsgi.application',
+            help='WSGI-приложение для запросов в процессе',
+        )
+        parser.add_argument(
+            '--host',
+            default=None,
+            help='Host для запросов в процессе',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Размер пула',
+        )
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Пул процессов вместо потоков',
+        )
+        parser.add_argument(
+            '--speed',
+            type=float,
+            default=0,
+            help='Во сколько раз ускорить паузы из лога; 0 - без пауз',
+        )
+
+    def handle(self, *args, **options):
+        if options['log'] == '-':
+            entries, skipped = read_log(sys.stdin)
+        else:
+            try:
+                with open(options['log']) as log:
+                    entries, skipped = read_log(log)
+            except OSError as error:
+                raise CommandError(error)
+        if skipped:
+            self.stderr.write(f'Пропущено нераспознанных строк: {skipped}')
+        if not entries:
+            raise CommandError('В логе нет запросов')
+        unsafe = sum(
+            1 for entry in entries if entry.method not in SAFE_METHODS
+        )
+        if unsafe:
+            self.stderr.write(
+                f'Запросов {unsafe} без тела и CSRF-токена (POST и др.): '
+                f'их ответы 4xx показаны отдельно от ошибок'
+            )
+        if options['url']:
+            target = HTTPTarget(options['url'])
+        else:
+            target = WSGITarget(
+                options['host'] or settings.ALLOWED_HOSTS[0], options['app']
+            )
+        results, seconds = replay(
+            entries, target, options['concurrency'],
+            options['processes'], options['speed'],
+        )
+        self.stdout.write(
+            f"{'маршрут':<28} {'запр.':>6} {'в сек':>7} {'ошибки':>7} "
+            f"{'4xx':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'макс':>8} "
+            f"{'очередь p99':>11}"
+        )
+        for row in summarize(results, seconds):
+            self.stdout.write(
+                f"{row['route']:<28} {row['requests']:>6} "
+                f"{row['rps']:>7.1f} {row['errors']:>7.1%} "
+                f"{row['client_errors']:>7.1%} "
+                f"{row['p50']:>8.1f} {row['p90']:>8.1f} "
+                f"{row['p99']:>8.1f} {row['max']:>8.1f} "
+                f"{row['queue_p99']:>11.1f}"
+            )
+        self.stdout.write(
+            f'Прогон занял {seconds:.2f} с, задержки в мс; при --speed '
+            f'они считаются от времени запроса по логу'
+        )
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+
+from core.querylog import read_records
+
+ORDERINGS = {
+    'total': lambda group: group['total'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Ранжирует медленные запросы из журнала по отпечаткам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort',
+            choices=sorted(ORDERINGS),
+            default='total',
+            help='Сортировка: суммарное время, число или максимум',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько отпечатков показать',
+        )
+
+    def handle(self, *args, **options):
+        groups = {}
+        for record in read_records():
+            group = groups.setdefault(record['fingerprint'], {
+                'statement': record['statement'],
+                'count': 0,
+                'total': 0,
+                'max': 0,
+                'sites': set(),
+                'plan': None,
+            })
+            group['count'] += 1
+            group['total'] += record['ms']
+            group['max'] = max(group['max'], record['ms'])
+            group['sites'].add(
+                ' <- '.join(filter(None, (record['template'], record['site'])))
+            )
+            group['plan'] = record['plan'] or group['plan']
+        ranked = sorted(
+            groups.items(), key=lambda item: ORDERINGS[options['sort']](
+                item[1]
+            ), reverse=True,
+        )[:options['limit']]
+        for key, group in ranked:
+            self.stdout.write(
+                f"{key} всего {group['total']:.1f} мс, "
+                f"{group['count']} раз, макс. {group['max']:.1f} мс, "
+                f"в среднем {group['total'] / group['count']:.1f} мс"
+            )
+            self.stdout.write(f"  {group['statement']}")
+            for site in sorted(filter(None, group['sites'])):
+                self.stdout.write(f'  вызов: {site}')
+            for step in group['plan'] or ():
+                self.stdout.write(f'  план: {step}')
+        if not ranked:
+            self.stdout.write('Медленных запросов нет')
@@ -0,0 +1,186 @@
+import os
+import random
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+_lock = threading.Lock()
+_routes = {}
+
+_tracing_lock = threading.Lock()
+_sampling = 0
+_started_for_sampling = False
+
+
+def ensure_tracing():
+    """Включает tracemalloc насовсем: снимкам для memory_diff нужна
+    непрерывная история выделений."""
+    global _started_for_sampling
+    with _tracing_lock:
+        _started_for_sampling = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMTRACK_FRAMES)
+
+
+@contextmanager
+def sampling():
+    """tracemalloc на время выборочных запросов: включается первым
+    и выключается последним из одновременных замеров, если до них
+    трассировка была выключена."""
+    global _sampling, _started_for_sampling
+    with _tracing_lock:
+        if not _sampling and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMTRACK_FRAMES)
+            _started_for_sampling = True
+        _sampling += 1
+    try:
+        yield
+    finally:
+        with _tracing_lock:
+            _sampling -= 1
+            if not _sampling and _started_for_sampling:
+                tracemalloc.stop()
+                _started_for_sampling = False
+
+
+def baseline():
+    """Снимок и объем памяти перед запросом; пик считается от них.
+
+    tracemalloc.reset_peak появился в Python 3.9, на старых версиях
+    пик сбрасывается вместе с трассами через clear_traces.
+    """
+    if not hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.clear_traces()
+    before = tracemalloc.take_snapshot()
+    start, _ = tracemalloc.get_traced_memory()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    return before, start
+
+
+def top_lines(before, after, limit):
+    """Строки, больше всего выделившие за запрос: (файл:строка, байты)."""
+    own = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    stats = after.filter_traces(own).compare_to(
+        before.filter_traces(own), 'lineno'
+    )
+    return [
+        (f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+         stat.size_diff)
+        for stat in stats[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+def record(route, peak, retained, lines):
+    with _lock:
+        stats = _routes.setdefault(route, {
+            'requests': 0,
+            'peak_max': 0,
+            'peak_total': 0,
+            'retained_total': 0,
+            'lines': Counter(),
+        })
+        stats['requests'] += 1
+        stats['peak_max'] = max(stats['peak_max'], peak)
+        stats['peak_total'] += peak
+        stats['retained_total'] += retained
+        stats['lines'].update(dict(lines))
+
+
+def route_stats(limit=None):
+    """Сводка по маршрутам процесса, от больших удержаний к малым."""
+    limit = limit or settings.MEMTRACK_TOP_LINES
+    with _lock:
+        rows = [
+            {
+                'route': route,
+                'requests': stats['requests'],
+                'peak_max': stats['peak_max'],
+                'peak_avg': stats['peak_total'] // stats['requests'],
+                'retained_total': stats['retained_total'],
+                'top_lines': stats['lines'].most_common(limit),
+            }
+            for route, stats in _routes.items()
+        ]
+    return sorted(rows, key=lambda row: row['retained_total'], reverse=True)
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+
+
+def snapshot_path(name):
+    return os.path.join(settings.MEMTRACK_ROOT, f'{name}.snapshot')
+
+
+def stored_snapshots():
+    """Имена снимков на диске, от старых к новым."""
+    if not os.path.isdir(settings.MEMTRACK_ROOT):
+        return []
+    return sorted(
+        name[:-len('.snapshot')]
+        for name in os.listdir(settings.MEMTRACK_ROOT)
+        if name.endswith('.snapshot')
+    )
+
+
+def snapshot_pid(name):
+    """pid процесса из имени снимка: сравнивать стоит снимки одного воркера."""
+    return name.rsplit('-', 1)[-1]
+
+
+def latest_pair():
+    """Два последних снимка одного процесса или None."""
+    seen = {}
+    for name in reversed(stored_snapshots()):
+        pid = snapshot_pid(name)
+        if pid in seen:
+            return [name, seen[pid]]
+        seen[pid] = name
+    return None
+
+
+def dump_snapshot():
+    """Сохраняет снимок всей памяти процесса для memory_diff."""
+    ensure_tracing()
+    os.makedirs(settings.MEMTRACK_ROOT, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}'
+    tracemalloc.take_snapshot().dump(snapshot_path(name))
+    return name
+
+
+class MemoryTrackingMiddleware:
+    """Выборочно меряет память запросов через tracemalloc.
+
+    Доля запросов задается MEMTRACK_SAMPLE_RATE; при 0 tracemalloc не
+    запускается вовсе, а после замеров снова выключается. Пик
+    и удержание считаются по всему процессу, поэтому при параллельных
+    потоках это оценка сверху.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.MEMTRACK_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        with sampling():
+            before, start = baseline()
+            response = self.get_response(request)
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        match = request.resolver_match
+        record(
+            match.view_name if match else request.path,
+            peak - start,
+            current - start,
+            top_lines(before, after, settings.MEMTRACK_TOP_LINES),
+        )
+        return response
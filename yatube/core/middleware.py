@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user,
+    get_user_model, load_backend
+)
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.middleware.gzip import GZipMiddleware
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .cache import cache_is_shared
+from .streaming import compress_flushed
+
+USER_KEY = 'auth_user:{}'
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+def get_cached_user(request):
+    """Аналог django.contrib.auth.get_user, читающий User из кеша.
+
+    Только на общем кеше: сброс записи при смене пароля или блокировке
+    из локального кеша одного воркера не дошел бы до остальных.
+    """
+    if not cache_is_shared():
+        return get_user(request)
+    try:
+        user_id = get_user_model()._meta.pk.to_python(
+            request.session[SESSION_KEY]
+        )
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    key = USER_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    )):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: self.get_user(request))
+
+    @staticmethod
+    def get_user(request):
+        if not hasattr(request, '_cached_user'):
+            request._cached_user = get_cached_user(request)
+        return request._cached_user
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware, который не задерживает потоковые страницы.
+
+    Остальные ответы сжимаются как обычно, а поток - с досжатием после
+    каждого куска, чтобы шапка страницы уходила до списков.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming or response.has_header('Content-Encoding'):
+            return super().process_response(request, response)
+        chunks = response.streaming_content
+        response = super().process_response(request, response)
+        if response.get('Content-Encoding') == 'gzip':
+            response.streaming_content = compress_flushed(chunks)
+        return response
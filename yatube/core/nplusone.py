@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor
+)
+
+from .querylog import call_site
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class LazyLoadTracker:
+    """Считает ленивые загрузки связей по месту вызова.
+
+    Одна загрузка - норма, вторая из той же строки кода и шаблона
+    означает цикл по объектам без select_related. Исключение поднимается
+    в конце блока: {% if %} глотает ошибки, брошенные при рендере.
+    """
+
+    def __init__(self, mode, allow):
+        self.mode = mode
+        self.allow = set(allow)
+        self.loads = Counter()
+        self.problems = []
+
+    def loaded(self, instance, field):
+        relation = f'{instance._meta.label}.{field.name}'
+        if relation in self.allow:
+            return
+        python_site, template_site = call_site(ignore=(__file__,))
+        key = (relation, python_site, template_site)
+        self.loads[key] += 1
+        if self.loads[key] != 2:
+            return
+        message = (
+            f'N+1: {relation} загружается лениво в цикле, '
+            f'{template_site or python_site}'
+        )
+        if template_site:
+            message += f' ({python_site})'
+        if self.mode == 'raise':
+            self.problems.append(message)
+        else:
+            logger.warning(message)
+
+    def check(self):
+        if self.problems:
+            raise NPlusOneError('\n'.join(self.problems))
+
+
+@contextmanager
+def detect_n_plus_one(mode=None, allow=None):
+    """Следит за ленивыми загрузками внутри блока.
+
+    По умолчанию режим и разрешенные связи берутся из NPLUSONE_MODE
+    и NPLUSONE_ALLOW; вложенный блок переиспользует внешний трекер.
+    """
+    if getattr(_state, 'tracker', None) is not None:
+        yield _state.tracker
+        return
+    _state.tracker = LazyLoadTracker(
+        mode or settings.NPLUSONE_MODE,
+        settings.NPLUSONE_ALLOW if allow is None else allow,
+    )
+    try:
+        yield _state.tracker
+    finally:
+        tracker, _state.tracker = _state.tracker, None
+    tracker.check()
+
+
+def tracked_get_object(get_object):
+    def wrapper(descriptor, instance):
+        tracker = getattr(_state, 'tracker', None)
+        if tracker is not None:
+            tracker.loaded(instance, descriptor.field)
+        return get_object(descriptor, instance)
+    wrapper.tracked = True
+    return wrapper
+
+
+def install():
+    """Перехватывает ленивую загрузку ForeignKey и OneToOneField."""
+    get_object = ForwardManyToOneDescriptor.get_object
+    if not getattr(get_object, 'tracked', False):
+        ForwardManyToOneDescriptor.get_object = tracked_get_object(
+            get_object
+        )
+
+
+class NPlusOneMiddleware:
+    """Проверяет каждый запрос; без NPLUSONE_MODE ничего не делает."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.NPLUSONE_MODE:
+            return self.get_response(request)
+        with detect_n_plus_one():
+            return self.get_response(request)
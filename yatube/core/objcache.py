@@ -0,0 +1,116 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from .cache import cache_is_shared
+
+MISSING = 'missing'
+
+
+class ObjectCache:
+    """Сквозной кеш объектов модели по pk или уникальному полю.
+
+    Промахи тоже кешируются (MISSING), чтобы несуществующий адрес не бил
+    в базу. Для поля, отличного от pk, в кеше лежит только pk: объект
+    берется по pk и сверяется с полем, поэтому переименование не оставляет
+    устаревших ссылок.
+
+    На локальном кеше воркера объекты всегда читаются из БД: сброс записи
+    в одном процессе не дошел бы до остальных.
+    """
+
+    def __init__(self, model, field='pk', timeout=None):
+        self.model = model
+        self.field = field
+        self.timeout = timeout
+        self.prefix = f'obj:{model._meta.label_lower}:{field}:'
+        self.by_pk = self if field == 'pk' else ObjectCache(model, 'pk')
+
+    def key(self, value):
+        if self.by_pk is not self:
+            value = md5(str(value).encode()).hexdigest()
+        return f'{self.prefix}{value}'
+
+    def get_timeout(self):
+        if self.timeout is None:
+            return settings.OBJECT_CACHE_TIMEOUT
+        return self.timeout
+
+    def fetch(self, values):
+        objects = self.model._default_manager.filter(
+            **{f'{self.field}__in': values}
+        )
+        return {getattr(obj, self.field): obj for obj in objects}
+
+    def get_many(self, values):
+        """{значение: объект} для найденных, одним запросом на все промахи."""
+        values = list(dict.fromkeys(values))
+        if not cache_is_shared():
+            return self.fetch(values)
+        cached = cache.get_many([self.key(value) for value in values])
+        found = {}
+        misses = []
+        for value in values:
+            item = cached.get(self.key(value))
+            if item is None:
+                misses.append(value)
+            elif item != MISSING:
+                found[value] = item
+        if self.by_pk is not self:
+            found, stale = self.resolve(found)
+            misses += stale
+        if misses:
+            fetched = self.fetch(misses)
+            cache.set_many({
+                self.key(value): (
+                    self.stored(fetched[value]) if value in fetched
+                    else MISSING
+                )
+                for value in misses
+            }, self.get_timeout())
+            if self.by_pk is not self:
+                self.by_pk.put(fetched.values())
+            found.update(fetched)
+        return found
+
+    def resolve(self, pointers):
+        """Объекты по сохраненным pk; устаревшие ссылки — в промахи."""
+        objects = self.by_pk.get_many(pointers.values())
+        found = {}
+        stale = []
+        for value, pk in pointers.items():
+            obj = objects.get(pk)
+            if obj is not None and getattr(obj, self.field) == value:
+                found[value] = obj
+            else:
+                stale.append(value)
+        return found, stale
+
+    def stored(self, obj):
+        return obj if self.by_pk is self else obj.pk
+
+    def put(self, objects):
+        cache.set_many({
+            self.key(getattr(obj, self.field)): self.stored(obj)
+            for obj in objects
+        }, self.get_timeout())
+
+    def get(self, value):
+        return self.get_many([value]).get(value)
+
+    def get_or_404(self, value):
+        obj = self.get(value)
+        if obj is None:
+            raise Http404('Объект не найден.')
+        return obj
+
+    def invalidate(self, obj):
+        """Сбрасывает объект и промах по его текущему значению поля."""
+        self.invalidate_values([getattr(obj, self.field)])
+        if self.by_pk is not self:
+            self.by_pk.invalidate(obj)
+
+    def invalidate_values(self, values):
+        cache.delete_many([self.key(value) for value in values])
@@ -0,0 +1,123 @@
+from hashlib import md5
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+
+from .cache import cache_is_shared
+
+PAGE_KEY = 'page:{}'
+
+TAG_KEY = 'page_tag:{}'
+
+
+def tag_page(request, *tags):
+    """Помечает страницу зависимостями: только такие страницы кешируются.
+
+    Версии тегов запоминаются сразу, до рендера: если тег сбросят, пока
+    страница строится, запись с ними окажется устаревшей.
+    """
+    if not hasattr(request, 'page_cache_key'):
+        return
+    versions = getattr(request, 'page_cache_versions', {})
+    new = [tag for tag in tags if tag not in versions]
+    if new:
+        versions.update(tag_versions(new))
+    request.page_cache_versions = versions
+
+
+def on_page_hit(request, func_path, *args):
+    """Действие, которое нужно выполнить и при отдаче страницы из кеша."""
+    request.page_cache_hits = getattr(request, 'page_cache_hits', [])
+    request.page_cache_hits.append((func_path, args))
+
+
+def purge_tags(*tags):
+    cache.delete_many([TAG_KEY.format(tag) for tag in tags])
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; отсутствующим выдаются новые.
+
+    Новая версия пишется через add и перечитывается: два запроса, которые
+    одновременно не нашли тег, иначе затерли бы версии друг друга.
+    """
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    fresh = {key: uuid4().hex for key in keys if key not in versions}
+    if fresh:
+        for key, version in fresh.items():
+            cache.add(key, version, None)
+        versions.update(fresh)
+        versions.update(cache.get_many(fresh))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def page_key(request):
+    params = sorted(
+        (name, value)
+        for name in request.GET for value in request.GET.getlist(name)
+    )
+    raw = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    return PAGE_KEY.format(md5(raw.encode()).hexdigest())
+
+
+class AnonymousPageCacheMiddleware(MiddlewareMixin):
+    """Готовые страницы для анонимов: без сессий, шаблонов и запросов.
+
+    Анонимом считается запрос без cookie сессии. Запись хранит версии
+    своих тегов и считается устаревшей, как только хотя бы один тег
+    сброшен через purge_tags. Работает только на общем кеше: сброс в
+    локальном кеше одного воркера не дошел бы до остальных.
+    """
+
+    def is_cacheable_request(self, request):
+        return (
+            cache_is_shared()
+            and request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and set(request.GET) <= set(settings.PAGE_CACHE_PARAMS)
+        )
+
+    def process_request(self, request):
+        if not self.is_cacheable_request(request):
+            return None
+        request.page_cache_key = page_key(request)
+        entry = cache.get(request.page_cache_key)
+        if entry is None:
+            return None
+        versions, hits, response = entry
+        current = cache.get_many([TAG_KEY.format(tag) for tag in versions])
+        if any(
+            current.get(TAG_KEY.format(tag)) != version
+            for tag, version in versions.items()
+        ):
+            return None
+        for func_path, args in hits:
+            import_string(func_path)(*args)
+        return response
+
+    def process_response(self, request, response):
+        versions = getattr(request, 'page_cache_versions', None)
+        if (
+            not versions
+            or request.method != 'GET'
+            or not hasattr(request, 'page_cache_key')
+            or response.status_code != 200
+            or response.streaming
+            or response.cookies
+        ):
+            return response
+        cache.set(
+            request.page_cache_key,
+            (
+                versions,
+                getattr(request, 'page_cache_hits', []),
+                response,
+            ),
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+        return response
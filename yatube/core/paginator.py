@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+ESTIMATE_QUERIES = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+    'mysql': (
+        'SELECT table_rows FROM information_schema.tables '
+        'WHERE table_schema = DATABASE() AND table_name = %s'
+    ),
+    'sqlite': (
+        'SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 '
+        'WHERE tbl = %s ORDER BY idx IS NOT NULL LIMIT 1'
+    ),
+}
+
+
+def estimate_table_rows(model, using='default'):
+    """Число строк таблицы по статистике СУБД, иначе по максимальному pk."""
+    connection = connections[using]
+    sql = ESTIMATE_QUERIES.get(connection.vendor)
+    if sql is not None:
+        try:
+            with transaction.atomic(using), connection.cursor() as cursor:
+                cursor.execute(sql, (model._meta.db_table,))
+                row = cursor.fetchone()
+        except DatabaseError:
+            row = None
+        if row and row[0]:
+            return int(row[0])
+    max_pk = model._default_manager.using(using).aggregate(
+        max_pk=Max('pk'),
+    )['max_pk']
+    return max_pk or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для списков без фильтров берет оценку числа строк вместо COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return super().count
+        estimate = estimate_table_rows(
+            self.object_list.model, self.object_list.db
+        )
+        if estimate < settings.ESTIMATED_COUNT_THRESHOLD:
+            return super().count
+        return estimate
@@ -0,0 +1,138 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def profile_requested(request):
+    if not (
+        settings.PROFILE_PARAM in request.GET
+        or request.META.get(settings.PROFILE_HEADER)
+    ):
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+def stored_profiles():
+    """Имена сохраненных профилей, от новых к старым."""
+    if not os.path.isdir(settings.PROFILE_ROOT):
+        return []
+    return sorted(
+        (
+            name[:-len('.prof')]
+            for name in os.listdir(settings.PROFILE_ROOT)
+            if name.endswith('.prof')
+        ),
+        reverse=True,
+    )
+
+
+def profile_paths(name):
+    path = os.path.join(settings.PROFILE_ROOT, name)
+    return f'{path}.prof', f'{path}.json'
+
+
+def save_profile(profiler, meta):
+    """Сохраняет статистику и метаданные, удаляя профили сверх PROFILE_KEEP."""
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid4().hex[:4]}'
+    stats_path, meta_path = profile_paths(name)
+    profiler.dump_stats(stats_path)
+    with open(meta_path, 'w') as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False)
+    for old in stored_profiles()[settings.PROFILE_KEEP:]:
+        for path in profile_paths(old):
+            if os.path.exists(path):
+                os.remove(path)
+    return name
+
+
+def load_meta(name):
+    try:
+        with open(profile_paths(name)[1]) as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        return {}
+
+
+def function_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def collapsed_stacks(stats):
+    """Строки "a;b;c микросекунды" для flamegraph.pl и speedscope.
+
+    pstats хранит только пары вызывающий-вызываемый, поэтому стеки
+    восстанавливаются по графу: собственное время функции делится между
+    путями пропорционально времени, пришедшему по каждому ребру.
+    """
+    entries = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    lines = {}
+
+    def walk(func, stack, share, path):
+        _, _, own, total, _ = entries[func]
+        if total * share < 1e-6:
+            return
+        stack = stack + (function_label(func).replace(';', ','),)
+        micros = int(own * share * 1_000_000)
+        if micros:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + micros
+        for callee, edge_total in callees.get(func, ()):
+            callee_total = entries[callee][3]
+            if callee in path or not callee_total:
+                continue
+            share_in = share * min(edge_total / callee_total, 1)
+            walk(callee, stack, share_in, path | {callee})
+
+    for func, entry in entries.items():
+        if not entry[4]:
+            walk(func, (), 1, {func})
+    return [f'{stack} {micros}' for stack, micros in lines.items()]
+
+
+def print_top(name, sort, limit, stream):
+    stats = pstats.Stats(profile_paths(name)[0], stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+class ProfileMiddleware:
+    """Профилирует запрос сотрудника по параметру PROFILE_PARAM или
+    заголовку PROFILE_HEADER; имя профиля возвращается в X-Profile-Id.
+
+    Стоит последним, чтобы request.user уже был, а в профиль попали
+    только представление и рендер шаблонов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profile_requested(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        started = time.monotonic()
+        response = profiler.runcall(self.get_response, request)
+        name = save_profile(profiler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'seconds': round(time.monotonic() - started, 4),
+            'created': timezone.now().isoformat(),
+        })
+        response['X-Profile-Id'] = name
+        return response
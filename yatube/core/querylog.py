@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import closing
+from hashlib import md5
+
+from django.conf import settings
+from django.utils import timezone
+
+EXPLAIN_MEMORY = 1000
+
+_lock = threading.Lock()
+_explained = set()
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def fingerprint(sql):
+    """SQL без литералов и параметров и короткий хеш для группировки."""
+    statement = STRING_LITERAL.sub('?', sql)
+    statement = re.sub(r'\b\d+\b', '?', statement).replace('%s', '?')
+    statement = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', statement)
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement, md5(statement.encode()).hexdigest()[:12]
+
+
+def call_site(ignore=()):
+    """Ближайшие к запросу строка кода проекта и узел шаблона."""
+    ignore = {__file__, *ignore}
+    python_site = template_site = None
+    frame = sys._getframe(1)
+    while frame is not None and not (python_site and template_site):
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if template_site is None and origin and token:
+                template_site = f'{origin.template_name}:{token.lineno}'
+        elif (
+            python_site is None
+            and code.co_filename.startswith(settings.BASE_DIR)
+            and code.co_filename not in ignore
+        ):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            python_site = f'{path}:{frame.f_lineno} {code.co_name}'
+        frame = frame.f_back
+    return python_site, template_site
+
+
+def explain(connection, sql, params):
+    """План запроса через отдельный курсор: результат исходного запроса
+    и execute_wrappers не затрагиваются. Строковые значения из условий
+    плана заменяются на ?."""
+    prefix = 'EXPLAIN'
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    try:
+        with closing(connection.create_cursor()) as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [
+                STRING_LITERAL.sub(
+                    '?', ' '.join(str(column) for column in row)
+                )
+                for row in cursor.fetchall()
+            ]
+    except connection.Database.Error:
+        return None
+
+
+def write_record(record):
+    """Дописывает строку JSON; лог больше SLOW_QUERY_LOG_SIZE уходит в .1."""
+    line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    path = settings.SLOW_QUERY_LOG
+    with _lock:
+        try:
+            with open(path, 'a') as log:
+                log.write(line)
+            if os.path.getsize(path) > settings.SLOW_QUERY_LOG_SIZE:
+                os.replace(path, f'{path}.1')
+        except OSError:
+            pass
+
+
+def record_slow_query(connection, sql, params, many, ms):
+    """В лог идет только отпечаток запроса: параметры бывают ключами
+    сессий и хешами паролей."""
+    statement, key = fingerprint(sql)
+    plan = None
+    if (
+        not many
+        and key not in _explained
+        and sql.lstrip()[:6].upper() == 'SELECT'
+    ):
+        if len(_explained) >= EXPLAIN_MEMORY:
+            _explained.clear()
+        _explained.add(key)
+        plan = explain(connection, sql, params)
+    python_site, template_site = call_site()
+    write_record({
+        'time': timezone.now().isoformat(),
+        'fingerprint': key,
+        'statement': statement,
+        'ms': round(ms, 2),
+        'plan': plan,
+        'site': python_site,
+        'template': template_site,
+    })
+
+
+def observe_query(execute, sql, params, many, context):
+    """execute_wrapper: пишет запросы дольше SLOW_QUERY_MS в лог."""
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        if ms >= threshold:
+            record_slow_query(context['connection'], sql, params, many, ms)
+
+
+def read_records():
+    path = settings.SLOW_QUERY_LOG
+    for name in (f'{path}.1', path):
+        try:
+            with open(name) as log:
+                for line in log:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
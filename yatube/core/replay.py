@@ -0,0 +1,284 @@
+import json
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from http.client import HTTPConnection
+from io import BytesIO
+from math import ceil
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+)
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+Entry = namedtuple('Entry', 'offset method path user')
+
+# seconds - от срока по логу (при --speed) или от взятия в работу до
+# ответа, queued - сколько запрос ждал свободного воркера.
+Result = namedtuple('Result', 'route status seconds queued')
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# 127.0.0.1 - user [10/Oct/2000:13:55:36 -0700] "GET /path HTTP/1.1" 200 ...
+ACCESS_LINE = re.compile(
+    r'^\S+ \S+ (?P<user>\S+) \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*"'
+)
+
+_target = None
+
+
+def parse_time(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    moment = parse_datetime(value)
+    if moment is None:
+        moment = datetime.strptime(value, '%d/%b/%Y:%H:%M:%S %z')
+    return moment.timestamp()
+
+
+def parse_line(line):
+    """Запись лога: JSON-строка с time, method, path, user или строка
+    access-лога в формате combined; чужие и битые строки - None."""
+    line = line.strip()
+    try:
+        if line.startswith('{'):
+            record = json.loads(line)
+            return (
+                parse_time(record['time']), record.get('method', 'GET'),
+                record['path'], record.get('user') or None,
+            )
+        match = ACCESS_LINE.match(line)
+        if match is None:
+            return None
+        user = match['user']
+        return (
+            parse_time(match['time']), match['method'], match['path'],
+            None if user == '-' else user,
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def read_log(lines):
+    """Записи со смещением в секундах от первой, в порядке времени,
+    и число пропущенных непустых строк."""
+    parsed = []
+    skipped = 0
+    for line in lines:
+        record = parse_line(line)
+        if record is not None:
+            parsed.append(record)
+        elif line.strip():
+            skipped += 1
+    parsed.sort()
+    if not parsed:
+        return [], skipped
+    first = parsed[0][0]
+    return [
+        Entry(moment - first, method, path, user)
+        for moment, method, path, user in parsed
+    ], skipped
+
+
+def route_of(path):
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return 'unresolved'
+    return match.view_name
+
+
+def session_cookie(username):
+    """Кука сессии пользователя, как после входа на сайт."""
+    user = get_user_model()._default_manager.get_by_natural_key(username)
+    engine = import_string(f'{settings.SESSION_ENGINE}.SessionStore')
+    session = engine()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+class Target:
+    def __init__(self, host):
+        self.host = host
+        self.cookies = {}
+        self.lock = threading.Lock()
+
+    def cookie(self, username):
+        if username is None:
+            return None
+        with self.lock:
+            if username not in self.cookies:
+                self.cookies[username] = session_cookie(username)
+            return self.cookies[username]
+
+
+class WSGITarget(Target):
+    """Запросы прямо в WSGI-приложение этого процесса."""
+
+    def __init__(self, host, application='yatube.wsgi.application'):
+        super().__init__(host)
+        self.application = import_string(application)
+
+    def send(self, method, path, cookie):
+        parts = urlsplit(path)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': self.host,
+            'REMOTE_ADDR': '127.0.0.1',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        status = []
+        body = self.application(
+            environ, lambda line, headers, *args: status.append(line)
+        )
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return int(status[0].split()[0])
+
+
+class HTTPTarget(Target):
+    """Запросы к запущенному серверу по keep-alive соединению на поток."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        super().__init__(parts.netloc)
+        self.local = threading.local()
+
+    def send(self, method, path, cookie, headers=None):
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = HTTPConnection(self.host, timeout=60)
+        headers = dict(headers or {})
+        if cookie:
+            headers['Cookie'] = cookie
+        try:
+            self.local.connection.request(method, path, headers=headers)
+            response = self.local.connection.getresponse()
+            response.read()
+        except OSError:
+            self.local.connection.close()
+            self.local.connection = None
+            raise
+        return response.status
+
+
+def replay_entry(entry, due, paced):
+    """Результат одного запроса; исключение считается статусом 0.
+
+    При paced задержка считается от срока due, а не от момента, когда
+    воркер взял запрос: иначе ожидание в переполненном пуле выпало бы
+    из p90 и p99.
+    """
+    picked = time.monotonic()
+    try:
+        status = _target.send(
+            entry.method, entry.path, _target.cookie(entry.user)
+        )
+    except Exception:
+        status = 0
+    finished = time.monotonic()
+    return Result(
+        route_of(entry.path), status,
+        finished - (due if paced else picked), picked - due,
+    )
+
+
+def replay(entries, target, concurrency, processes=False, speed=0):
+    """Проигрывает записи в пуле; speed > 0 сохраняет паузы между ними,
+    ускоренные в speed раз, 0 - шлет без пауз. Возвращает результаты
+    и длительность прогона."""
+    global _target
+    _target = target
+    if processes:
+        connections.close_all()
+        executor = ProcessPoolExecutor(concurrency, mp_context=get_context(
+            'fork'
+        ))
+    else:
+        executor = ThreadPoolExecutor(concurrency)
+    started = time.monotonic()
+    with executor:
+        futures = []
+        for entry in entries:
+            due = time.monotonic()
+            if speed:
+                due = started + entry.offset / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(
+                replay_entry, entry, due, bool(speed)
+            ))
+        results = [future.result() for future in futures]
+    return results, time.monotonic() - started
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    index = max(ceil(len(values) * share) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(results, seconds):
+    """Строки отчета по маршрутам и итог, от самых частых маршрутов."""
+    routes = {}
+    for result in results:
+        routes.setdefault(result.route, []).append(result)
+    rows = []
+    for route, items in sorted(
+        routes.items(), key=lambda item: len(item[1]), reverse=True
+    ):
+        rows.append(stats_row(route, items, seconds))
+    rows.append(stats_row('всего', results, seconds))
+    return rows
+
+
+def stats_row(route, items, seconds):
+    """Ошибки - сбои соединения и 5xx; 4xx считаются отдельно: так
+    отвечают, например, на POST без тела и CSRF-токена."""
+    latencies = sorted(item.seconds * 1000 for item in items)
+    queued = sorted(item.queued * 1000 for item in items)
+    errors = sum(1 for item in items if not 0 < item.status < 500)
+    client_errors = sum(1 for item in items if 400 <= item.status < 500)
+    return {
+        'route': route,
+        'requests': len(items),
+        'rps': len(items) / seconds if seconds else 0,
+        'errors': errors / len(items),
+        'client_errors': client_errors / len(items),
+        'queue_p99': percentile(queued, 0.99),
+        'p50': percentile(latencies, 0.5),
+        'p90': percentile(latencies, 0.9),
+        'p99': percentile(latencies, 0.99),
+        'max': latencies[-1],
+    }
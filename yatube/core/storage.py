@@ -0,0 +1,50 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хешированные имена, манифест и сжатые .gz рядом с текстовыми файлами.
+
+    Без манифеста (collectstatic не запускался, например в тестах)
+    {% static %} отдает исходное имя вместо ошибки.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if (
+                not dry_run and hashed_name
+                and not isinstance(processed, Exception)
+            ):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        if os.path.splitext(name)[1] not in settings.STATIC_GZIP_EXTENSIONS:
+            return
+        with self.open(name) as source:
+            content = source.read()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) >= len(content):
+            return
+        gz_name = f'{name}.gz'
+        if self.exists(gz_name):
+            self.delete(gz_name)
+        self._save(gz_name, ContentFile(compressed))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def is_immutable(self, name):
+        """Имя с хешем содержимого из манифеста: файл никогда не меняется."""
+        return name in self.hashed_files.values()
@@ -0,0 +1,133 @@
+from gzip import GzipFile
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template import loader
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode, IncludeNode
+)
+from django.utils.text import StreamingBuffer
+
+FLUSH = None
+
+
+def iter_nodes(nodelist, context):
+    """Рендер списка узлов по частям; FLUSH — место, где можно отдать байты.
+
+    {% extends %} и {% block %} разворачиваются так же, как в
+    ExtendsNode.render и BlockNode.render, остальные узлы рендерятся
+    целиком. Накопленный текст отправляется перед {% include %} и
+    блочными тегами ({% for %}, {% if %}, {% cache %}): они и бывают
+    долгими, а простые теги вроде {% url %} кусков не дробят.
+    """
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            yield from iter_extends(node, context)
+        elif isinstance(node, BlockNode):
+            yield from iter_block(node, context)
+        else:
+            if isinstance(node, IncludeNode) or any(
+                getattr(node, attr, None) for attr in node.child_nodelists
+            ):
+                yield FLUSH
+            yield str(node.render_annotated(context))
+
+
+def iter_extends(node, context):
+    parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block
+                    for block in parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    with context.render_context.push_state(parent, isolated_context=False):
+        yield from iter_nodes(parent.nodelist, context)
+
+
+def iter_block(node, context):
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from iter_nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from iter_nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
+
+
+def stream_template(template_name, context, request):
+    """Куски страницы по мере рендера, соседний текст склеивается."""
+    template = loader.get_template(template_name).template
+    context = make_context(
+        context, request, autoescape=template.engine.autoescape
+    )
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            chunk = []
+            for bit in iter_nodes(template.nodelist, context):
+                if bit is not FLUSH:
+                    chunk.append(bit)
+                elif chunk:
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+
+
+def streaming_render(request, template_name, context=None):
+    """Как render, но шапка страницы уходит клиенту до рендера списков.
+
+    CSRF-токен и пользователь запрашиваются заранее: иначе cookie и
+    заголовок Vary: Cookie не успели бы попасть в ответ.
+    """
+    get_token(request)
+    # Вычисляет ленивый request.user до начала потока: чтение сессии
+    # добавит Vary: Cookie, а сброс сессии при неверном хеше пароля
+    # еще успеет удалить cookie в заголовках ответа.
+    request.user.is_authenticated
+    return StreamingHttpResponse(
+        stream_template(template_name, context, request),
+        content_type='text/html; charset=utf-8',
+    )
+
+
+def render_page(request, template_name, context=None):
+    """Потоковый рендер, если он включен в STREAM_PAGES, иначе render."""
+    if settings.STREAM_PAGES:
+        return streaming_render(request, template_name, context)
+    return render(request, template_name, context)
+
+
+def compress_flushed(chunks):
+    """Как django.utils.text.compress_sequence, но после каждого куска
+    zlib сбрасывается (Z_SYNC_FLUSH): без этого клиент получил бы только
+    заголовок gzip, а всю страницу - в самом конце."""
+    buffer = StreamingBuffer()
+    with GzipFile(
+        mode='wb', compresslevel=6, fileobj=buffer, mtime=0
+    ) as zfile:
+        yield buffer.read()
+        for chunk in chunks:
+            zfile.write(chunk)
+            zfile.flush()
+            yield buffer.read()
+    yield buffer.read()
@@ -0,0 +1,46 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from ..cache import get_or_compute
+
+register = template.Library()
+
+
+class StampedeCacheNode(CacheNode):
+    def render(self, context):
+        try:
+            timeout = int(self.expire_time_var.resolve(context))
+        except (template.VariableDoesNotExist, ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                '"stampede_cache" tag got an invalid timeout: '
+                f'{self.expire_time_var.var!r}'
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            timeout,
+        )
+
+
+@register.tag
+def stampede_cache(parser, token):
+    """Замена {% cache %} с тем же синтаксисом, но без лавины пересчетов.
+
+    {% stampede_cache [timeout] [fragment_name] [var1] [var2] .. %}
+    """
+    nodelist = parser.parse(('endstampede_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return StampedeCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(name) for name in tokens[3:]],
+        None,
+    )
@@ -1,6 +1,39 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zlib
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.likes import like
+from posts.models import Comment, Group, Post
+from posts.viewcounter import pending_views
+from .cache import LOCK_KEY, get_or_compute, stampede_cached
+from .memtrack import reset as reset_memory_stats, route_stats
+from .middleware import USER_KEY
+from .nplusone import NPlusOneError, detect_n_plus_one
+from .objcache import ObjectCache
+from .profiling import stored_profiles
+from .querylog import fingerprint, read_records
+from .replay import WSGITarget, percentile, read_log
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +41,690 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+TEMP_CACHE_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': TEMP_CACHE_ROOT,
+    }
+}
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_session_and_user_from_cache(self):
+        """Сессия и пользователь читаются из кеша без запросов к БД"""
+        self.authorized_client.get(reverse('about:author'))
+        with self.assertNumQueries(0):
+            response = self.authorized_client.get(reverse('about:author'))
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_user_cache_invalidated(self):
+        """Кеш пользователя сбрасывается при смене пароля и выходе"""
+        key = USER_KEY.format(self.user.pk)
+        self.authorized_client.get(reverse('about:author'))
+        self.assertIsNotNone(cache.get(key))
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertIsNone(cache.get(key))
+        response = self.authorized_client.get(reverse('about:author'))
+        self.assertFalse(response.context['user'].is_authenticated)
+        self.authorized_client.force_login(self.user)
+        self.authorized_client.get(reverse('about:author'))
+        self.authorized_client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(key))
+
+    def test_process_local_cache_not_used_for_users(self):
+        """На локальном кеше процесса пользователь читается из БД"""
+        key = USER_KEY.format(self.user.pk)
+        with self.settings(CACHES=LOCAL_CACHES):
+            response = self.authorized_client.get(reverse('about:author'))
+            self.assertEqual(response.context['user'], self.user)
+            self.assertIsNone(cache.get(key))
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user_{number}')
+            for number in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.by_pk = ObjectCache(User)
+        self.by_username = ObjectCache(User, 'username')
+
+    def test_get_caches_hits_and_misses(self):
+        """Найденные и ненайденные объекты читаются из базы один раз"""
+        with self.assertNumQueries(2):
+            self.assertEqual(self.by_pk.get(self.users[0].pk), self.users[0])
+            self.assertIsNone(self.by_pk.get(0))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.by_pk.get(self.users[0].pk), self.users[0])
+            self.assertIsNone(self.by_pk.get(0))
+
+    def test_get_many_fetches_only_misses(self):
+        """get_many добирает промахи одним запросом"""
+        self.by_pk.get(self.users[0].pk)
+        pks = [user.pk for user in self.users] + [0]
+        with self.assertNumQueries(1):
+            found = self.by_pk.get_many(pks)
+        self.assertEqual(found, {user.pk: user for user in self.users})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.by_pk.get_many(pks), found)
+
+    def test_field_lookup_follows_rename(self):
+        """После переименования старое имя не находит объект"""
+        user = self.users[1]
+        self.assertIsNone(self.by_username.get('renamed'))
+        self.assertEqual(self.by_username.get(user.username), user)
+        old_username = user.username
+        user.username = 'renamed'
+        user.save()
+        self.by_username.invalidate(user)
+        self.assertIsNone(self.by_username.get(old_username))
+        self.assertEqual(self.by_username.get('renamed').pk, user.pk)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_local_cache_reads_db(self):
+        """На локальном кеше воркера объекты читаются из базы"""
+        user = self.users[2]
+        self.assertTrue(self.by_username.get(user.username).is_active)
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertFalse(self.by_username.get(user.username).is_active)
+        self.assertFalse(self.by_pk.get(user.pk).is_active)
+
+
+class CompressionAndStreamingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(
+            text='Текст поста ' * 50, author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_gzip_keeps_conditional_get(self):
+        """Сжатый ответ ослабляет ETag, и повторный запрос получает 304"""
+        response = self.client.get(
+            reverse('posts:index_rss'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response = self.client.get(
+            reverse('posts:index_rss'),
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(STREAM_PAGES=True)
+    def test_streamed_page_matches_render(self):
+        """Потоковая страница совпадает с обычной, шапка идет первой"""
+        address = reverse('posts:index')
+        response = self.client.get(address)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        header = next(
+            index for index, chunk in enumerate(chunks) if b'<nav' in chunk
+        )
+        self.assertNotIn(
+            self.post.text.encode(), b''.join(chunks[:header + 1])
+        )
+        with self.settings(STREAM_PAGES=False):
+            rendered = self.client.get(address).content
+        self.assertEqual(b''.join(chunks), rendered)
+
+    @override_settings(STREAM_PAGES=True)
+    def test_streamed_page_flushed_under_gzip(self):
+        """Сжатый поток отдается по кускам, шапка - до постов"""
+        address = reverse('posts:index')
+        response = self.client.get(address, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        chunks = [chunk for chunk in response.streaming_content if chunk]
+        self.assertGreater(len(chunks[1:]), 1)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        page = b''
+        for chunk in chunks:
+            page += decompressor.decompress(chunk)
+            if b'<nav' in page:
+                break
+        self.assertNotIn(self.post.text.encode(), page)
+        with self.settings(STREAM_PAGES=False):
+            rendered = self.client.get(address).content
+        self.assertEqual(gzip.decompress(b''.join(chunks)), rendered)
+
+    @override_settings(STREAM_PAGES=True)
+    def test_streamed_form_sets_csrf_cookie(self):
+        """Форма комментария в потоке получает CSRF-cookie"""
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn(b'csrfmiddlewaretoken', b''.join(response))
+
+
+class StaticAssetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        with open(os.path.join(cls.source, 'site.css'), 'w') as css:
+            css.write('body { margin: 0; }\n' * 100)
+        cls.settings_override = override_settings(
+            STATICFILES_DIRS=(cls.source,), STATIC_ROOT=cls.root
+        )
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.source, ignore_errors=True)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        with open(os.path.join(self.root, 'staticfiles.json')) as manifest:
+            self.hashed = json.load(manifest)['paths']['site.css']
+
+    def test_collect_writes_hashed_gzip_and_manifest(self):
+        """collectstatic пишет файл с хешем и сжатую копию"""
+        self.assertNotEqual(self.hashed, 'site.css')
+        with open(os.path.join(self.root, self.hashed), 'rb') as css:
+            content = css.read()
+        with gzip.open(os.path.join(self.root, f'{self.hashed}.gz')) as gz:
+            self.assertEqual(gz.read(), content)
+
+    def test_hashed_asset_is_immutable_and_precompressed(self):
+        """Файл с хешем кешируется навсегда и отдается сжатым"""
+        address = reverse('static_asset', args=(self.hashed,))
+        response = self.client.get(address, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(address)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(reverse('static_asset', args=('site.css',)))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_missing_asset(self):
+        response = self.client.get(
+            reverse('static_asset', args=('missing.css',))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get(
+            reverse('static_asset', args=('../yatube/settings.py',))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторная страница для анонима отдается без запросов к БД"""
+        address = reverse('posts:profile', args=(self.user.username,))
+        response = self.client.get(address)
+        with self.assertNumQueries(0):
+            cached = self.client.get(address)
+        self.assertEqual(cached.content, response.content)
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertContains(self.client.get(address), 'Новый пост')
+
+    def test_comment_purges_post_page_and_hits_count_views(self):
+        """Комментарий сбрасывает страницу поста, просмотры с кеша идут"""
+        address = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(address)
+        views = pending_views(self.post.pk)
+        with self.assertNumQueries(0):
+            self.client.get(address)
+        self.assertEqual(pending_views(self.post.pk), views + 1)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        self.assertContains(self.client.get(address), 'Свежий комментарий')
+
+    def test_purge_during_render_not_cached_as_current(self):
+        """Сброс тега во время рендера делает запись сразу устаревшей"""
+        address = reverse('posts:post_detail', args=(self.post.pk,))
+        purged = []
+
+        def comment_meanwhile(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if '"posts_comment"' in sql and not purged:
+                purged.append(sql)
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Во время рендера'
+                )
+            return result
+
+        with connection.execute_wrapper(comment_meanwhile):
+            self.client.get(address)
+        self.assertTrue(purged)
+        self.assertContains(self.client.get(address), 'Во время рендера')
+
+    def test_like_purges_lists_and_signup_does_not(self):
+        """Лайк сбрасывает списки со своим постом, регистрация - нет"""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Чужой пост', author=other)
+        addresses = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        untouched = reverse('posts:profile', args=(other.username,))
+        for address in addresses + (untouched,):
+            self.client.get(address)
+        User.objects.create_user(username='newcomer')
+        for address in addresses:
+            with self.subTest(address=address):
+                with self.assertNumQueries(0):
+                    self.client.get(address)
+        like(self.user, self.post)
+        with self.assertNumQueries(0):
+            self.client.get(untouched)
+        for address in addresses:
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(address)
+                self.assertTrue(queries.captured_queries)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_not_cached_on_process_local_cache(self):
+        """На локальном кеше воркера страницы не кешируются"""
+        address = reverse('posts:index')
+        self.client.get(address)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(address)
+        self.assertTrue(queries.captured_queries)
+
+    def test_not_cached_for_users_and_unknown_params(self):
+        """Авторизованным и запросам с чужими параметрами кеш не отдается"""
+        for client, address in (
+            (self.authorized_client, reverse('posts:index')),
+            (self.client, reverse('posts:index') + '?utm=1'),
+        ):
+            with self.subTest(address=address):
+                client.get(address)
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(address)
+                self.assertTrue(queries.captured_queries)
+
+
+@override_settings(STAMPEDE_WAIT=0)
+class StampedeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self):
+        self.calls.append(1)
+        return 'новое'
+
+    def test_stale_value_served_while_locked(self):
+        """Пока пересчет под блокировкой, остальным отдается старое значение"""
+        cache.set('key', ('старое', time.time() - 1, 0), 60)
+        cache.add(LOCK_KEY.format('key'), 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'старое')
+        self.assertEqual(self.calls, [])
+        cache.delete(LOCK_KEY.format('key'))
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'новое')
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    def test_early_refresh_and_cold_miss(self):
+        """Долгий пересчет обновляется заранее, холодный промах считается"""
+        cache.set('key', ('старое', time.time() + 60, 10 ** 6), 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'новое')
+        cache.add(LOCK_KEY.format('cold'), 1)
+        self.assertEqual(get_or_compute('cold', self.compute, 60), 'новое')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_decorator_and_template_tag(self):
+        """Декоратор и тег кешируют значение по ключу"""
+        cached = stampede_cached('double:{}', 60)(
+            lambda number: self.calls.append(number) or number * 2
+        )
+        self.assertEqual([cached(2), cached(2), cached(3)], [4, 4, 6])
+        self.assertEqual(self.calls, [2, 3])
+        fragment = Template(
+            '{% load stampede_cache %}'
+            '{% stampede_cache 60 fragment name %}{{ text }}'
+            '{% endstampede_cache %}'
+        )
+        first = fragment.render(Context({'name': 'a', 'text': 'один'}))
+        second = fragment.render(Context({'name': 'a', 'text': 'два'}))
+        self.assertEqual((first, second), ('один', 'один'))
+
+
+class ProfileMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def test_only_staff_requests_are_profiled_into_ring(self):
+        """Профилируются только запросы сотрудников, хранятся последние"""
+        with override_settings(PROFILE_ROOT=self.root, PROFILE_KEEP=2):
+            response = self.user_client.get('/?_profile=1')
+            self.assertNotIn('X-Profile-Id', response)
+            names = [
+                self.staff_client.get(
+                    '/', HTTP_X_PROFILE='1'
+                )['X-Profile-Id']
+                for _ in range(3)
+            ]
+            self.assertEqual(stored_profiles(), names[:0:-1])
+            self.assertEqual(len(os.listdir(self.root)), 4)
+
+    def test_report_prints_top_and_collapsed_stacks(self):
+        """Команда печатает топ функций и пишет свернутые стеки"""
+        with override_settings(PROFILE_ROOT=self.root):
+            name = self.staff_client.get('/?_profile=1')['X-Profile-Id']
+            out = StringIO()
+            call_command('profile_report', name, stdout=out)
+            self.assertIn('function calls', out.getvalue())
+            self.assertIn('GET /?_profile=1 200', out.getvalue())
+            path = os.path.join(self.root, 'stacks.txt')
+            call_command('profile_report', collapsed=path, stdout=out)
+            with open(path) as stacks:
+                line = stacks.readline()
+            self.assertRegex(line, r'^\S.* \d+$')
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(text='Пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.log = os.path.join(self.root, 'slow.log')
+        self.settings_override = override_settings(
+            SLOW_QUERY_MS=0, SLOW_QUERY_LOG=self.log
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_fingerprint_hides_literals(self):
+        """Запросы с разными значениями дают один отпечаток"""
+        first = fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND a = 1')
+        second = fingerprint("SELECT *  FROM t WHERE id IN (%s) AND a = 'x'")
+        self.assertEqual(first, second)
+
+    def test_records_plan_and_call_sites_and_report(self):
+        """Запрос пишется с планом, местом в коде и шаблоне"""
+        self.client.get(reverse('posts:profile', args=(self.user.username,)))
+        records = list(read_records())
+        self.assertTrue(records)
+        self.assertTrue(any(record['plan'] for record in records))
+        self.assertTrue(all(record['site'] for record in records))
+        self.assertTrue(any(
+            (record['template'] or '').startswith('posts/profile.html:')
+            for record in records
+        ))
+        out = StringIO()
+        with override_settings(SLOW_QUERY_MS=None):
+            call_command('slow_query_report', limit=1, stdout=out)
+        self.assertIn('вызов:', out.getvalue())
+        self.assertIn('план:', out.getvalue())
+
+    def test_params_not_logged(self):
+        """Значения параметров запросов в лог не попадают"""
+        User.objects.filter(username='секретный-ключ').exists()
+        with open(self.log) as log:
+            content = log.read()
+        self.assertIn('auth_user', content)
+        self.assertNotIn('секретный-ключ', content)
+
+
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        for number in range(2):
+            Post.objects.create(
+                text='Пост', author=cls.user, group=Group.objects.create(
+                    title='Группа', slug=f'group-{number}', description='-'
+                )
+            )
+
+    def load_groups(self):
+        return [post.group for post in Post.objects.all()]
+
+    def test_lazy_loads_in_loop_raise_unless_allowed(self):
+        """Ленивая загрузка в цикле падает, если связь не разрешена"""
+        with self.assertRaisesRegex(NPlusOneError, 'posts.Post.group'):
+            with detect_n_plus_one(mode='raise'):
+                self.load_groups()
+        with detect_n_plus_one(mode='raise', allow=('posts.Post.group',)):
+            self.load_groups()
+        with detect_n_plus_one(mode='raise'):
+            [post.group for post in Post.objects.select_related('group')]
+
+    def test_log_mode_warns(self):
+        """В режиме log N+1 пишется предупреждением"""
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            with detect_n_plus_one(mode='log'):
+                self.load_groups()
+        self.assertIn('core/tests.py', logs.output[0])
+
+
+class MemoryTrackingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.staff)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        reset_memory_stats()
+        self.addCleanup(tracemalloc.stop)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_sampled_routes_are_reported_to_staff_only(self):
+        """Память запросов собирается по маршрутам и видна сотрудникам"""
+        with override_settings(MEMTRACK_SAMPLE_RATE=1):
+            self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('memory_report'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        routes = {
+            row['route']: row
+            for row in self.staff_client.get(
+                reverse('memory_report')
+            ).json()['routes']
+        }
+        self.assertEqual(routes['posts:index']['requests'], 1)
+        self.assertGreater(routes['posts:index']['peak_max'], 0)
+        self.assertTrue(routes['posts:index']['top_lines'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_sampling_without_reset_peak(self):
+        """На Python до 3.9 без tracemalloc.reset_peak замер тоже идет"""
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)
+        if reset_peak is not None:
+            del tracemalloc.reset_peak
+            self.addCleanup(setattr, tracemalloc, 'reset_peak', reset_peak)
+        with override_settings(MEMTRACK_SAMPLE_RATE=1):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertGreater(route_stats()[0]['peak_max'], 0)
+
+    def test_snapshots_diff(self):
+        """Команда сравнивает два снимка памяти"""
+        with override_settings(MEMTRACK_ROOT=self.root):
+            names = [
+                self.staff_client.post(
+                    reverse('memory_report')
+                ).json()['snapshot']
+                for _ in range(2)
+            ]
+            other = '99991231-000000-000000-0'
+            shutil.copy(
+                os.path.join(self.root, f'{names[1]}.snapshot'),
+                os.path.join(self.root, f'{other}.snapshot'),
+            )
+            out = StringIO()
+            call_command('memory_diff', stdout=out)
+            with self.assertRaisesMessage(CommandError, 'разных процессах'):
+                call_command('memory_diff', names[0], other)
+        self.assertIn(f'{names[0]} -> {names[1]}', out.getvalue())
+
+
+class ReplayTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        Post.objects.create(text='Пост для нагрузки', author=self.user)
+        self.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def test_read_log_orders_both_formats(self):
+        """Лог читается в обоих форматах и по времени, битые строки
+        пропускаются и считаются"""
+        entries, skipped = read_log([
+            '{"time": "2026-10-19T10:00:02+00:00", "method": "GET", '
+            '"path": "/follow/", "user": "reader"}',
+            '127.0.0.1 - - [19/Oct/2026:10:00:00 +0000] '
+            '"GET /?page=2 HTTP/1.1" 200 512 "-" "curl"',
+            'мусор',
+            '{"time": "вчера", "path": "/"}',
+            '{"time": 1, "path": ',
+            '',
+        ])
+        self.assertEqual(
+            [(entry.offset, entry.path, entry.user) for entry in entries],
+            [(0, '/?page=2', None), (2, '/follow/', 'reader')],
+        )
+        self.assertEqual(skipped, 3)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+
+    def test_replay_reports_routes(self):
+        """Проигрывание дает строки по маршрутам без ошибок"""
+        path = os.path.join(self.root, 'requests.log')
+        with open(path, 'w') as log:
+            for second in range(4):
+                log.write(json.dumps({
+                    'time': second, 'method': 'GET', 'path': '/',
+                }) + '\n')
+                log.write(json.dumps({
+                    'time': second, 'path': '/follow/', 'user': 'reader',
+                }) + '\n')
+        out = StringIO()
+        call_command(
+            'replay_log', path, concurrency=2, speed=100, stdout=out,
+        )
+        report = out.getvalue()
+        self.assertRegex(report, r'posts:index +4 .* 0\.0%')
+        self.assertRegex(report, r'posts:follow_index +4 .* 0\.0%')
+        self.assertRegex(report, r'всего +8 ')
+        target = WSGITarget('localhost')
+        self.assertEqual(
+            target.send('GET', '/follow/', target.cookie('reader')),
+            HTTPStatus.OK,
+        )
+
+    def test_replay_reports_client_errors_apart(self):
+        """4xx считаются отдельно от ошибок, о POST есть предупреждение"""
+        path = os.path.join(self.root, 'posts.log')
+        with open(path, 'w') as log:
+            log.write(json.dumps({'time': 0, 'path': '/'}) + '\n')
+            log.write(json.dumps({
+                'time': 0, 'method': 'POST', 'path': '/create/',
+                'user': 'reader',
+            }) + '\n')
+            log.write(json.dumps({'time': 1, 'path': '/no-such/'}) + '\n')
+            log.write('{"time": 1\n')
+        out, err = StringIO(), StringIO()
+        call_command('replay_log', path, stdout=out, stderr=err)
+        self.assertRegex(out.getvalue(), r'всего +3 +\S+ +0\.0% +33\.3%')
+        self.assertIn('Пропущено нераспознанных строк: 1', err.getvalue())
+        self.assertIn('Запросов 1 без тела', err.getvalue())
@@ -1,4 +1,18 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .memtrack import dump_snapshot, route_stats
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
 
 
 def page_not_found(request, exception):
@@ -15,3 +29,48 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def static_asset(request, path):
+    """Статика из STATIC_ROOT: готовый .gz по Accept-Encoding и долгий кеш.
+
+    Файлы с хешем в имени не меняются, их можно кешировать навсегда;
+    остальные браузер перепроверяет через STATIC_MAX_AGE.
+    """
+    full_path = safe_join(settings.STATIC_ROOT, path)
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден.')
+    content_type, _ = mimetypes.guess_type(full_path)
+    encoding = None
+    if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        if os.path.isfile(f'{full_path}.gz'):
+            full_path = f'{full_path}.gz'
+            encoding = 'gzip'
+    response = FileResponse(
+        open(full_path, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if staticfiles_storage.is_immutable(path):
+        patch_cache_control(
+            response,
+            public=True,
+            immutable=True,
+            max_age=settings.STATIC_IMMUTABLE_MAX_AGE,
+        )
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.STATIC_MAX_AGE
+        )
+    return response
+
+
+@staff_member_required
+def memory_report(request):
+    """Память по маршрутам этого процесса; POST снимает снимок памяти."""
+    data = {'pid': os.getpid(), 'routes': route_stats()}
+    if request.method == 'POST':
+        data['snapshot'] = dump_snapshot()
+    return JsonResponse(data)
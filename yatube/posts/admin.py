@@ -1,9 +1,72 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.contrib.auth.admin import UserAdmin
 
-from .models import Comment, Follow, Group, Post
+from core.paginator import EstimatedCountPaginator
+from .archive import move_posts_to_group
+from .deletion import schedule_deletion
+from .models import Comment, Follow, Group, Post, User
+from .tags import extract_tags, sync_tags
+from .utils import pk_chunks
 
 
-class PostAdmin(admin.ModelAdmin):
+class RawIdWithoutLabelWidget(ForeignKeyRawIdWidget):
+    """Поле id с выбором во всплывающем окне без запроса подписи на строку."""
+
+    def label_and_url_for_value(self, value):
+        return '', ''
+
+
+class GroupActionForm(ActionForm):
+    group = forms.IntegerField(
+        label='ID группы',
+        required=False,
+        help_text='Для переноса в группу; пусто - убрать из группы',
+    )
+
+
+class SoftDeleteAdmin(admin.ModelAdmin):
+    """Удаление через очередь: объект прячется сразу, строки — порциями.
+
+    Страница подтверждения не обходит каскад: на авторе с тысячами
+    постов это тот же долгий сбор, от которого уходит очередь.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('delete_in_chunks',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_in_chunks(self, request, queryset):
+        deleted = 0
+        for chunk in pk_chunks(queryset, settings.ADMIN_BULK_CHUNK_SIZE):
+            deleted += len(chunk)
+            self.model.objects.filter(pk__in=chunk).delete()
+        self.message_user(request, f'Удалено записей: {deleted}')
+    delete_in_chunks.short_description = 'Удалить выбранные порциями'
+    delete_in_chunks.allowed_permissions = ('delete',)
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,12 +75,52 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    action_form = GroupActionForm
+    actions = ('reassign_group', 'delete_in_chunks')
 
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('widgets', {
+            'group': RawIdWithoutLabelWidget(
+                Post._meta.get_field('group').remote_field, self.admin_site
+            ),
+        })
+        return super().get_changelist_form(request, **kwargs)
 
-class GroupAdmin(admin.ModelAdmin):
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sync_tags(form.instance, extract_tags(form.instance.text))
+
+    def reassign_group(self, request, queryset):
+        # Админка уже проверила форму действия, здесь берется ее
+        # cleaned_data, а не сырой POST.
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            return
+        group_id = form.cleaned_data['group']
+        if group_id is not None and not Group.objects.filter(
+            pk=group_id
+        ).exists():
+            self.message_user(
+                request, f'Группы с id {group_id} нет', messages.ERROR
+            )
+            return
+        moved = sum(
+            move_posts_to_group(chunk, group_id)
+            for chunk in pk_chunks(queryset, settings.ADMIN_BULK_CHUNK_SIZE)
+        )
+        self.message_user(request, f'Перенесено постов: {moved}')
+    reassign_group.short_description = 'Перенести выбранные в группу'
+    reassign_group.allowed_permissions = ('change',)
+
+
+class GroupAdmin(SoftDeleteAdmin):
     list_display = (
         'pk',
         'title',
@@ -28,22 +131,33 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
         'author',
         'post',
     )
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+    date_hierarchy = 'created'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = (
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+
+
+class SoftDeleteUserAdmin(SoftDeleteAdmin, UserAdmin):
+    pass
 
 
+admin.site.unregister(User)
+admin.site.register(User, SoftDeleteUserAdmin)
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Управление записями'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if settings.VIEW_FLUSHER:
+            from .viewcounter import start_flusher
+            start_flusher()
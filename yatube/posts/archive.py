@@ -0,0 +1,94 @@
+from collections import Counter
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils import timezone
+
+from core.pagecache import purge_tags
+from .feeds import FEED_TAG
+from .lookups import post_cache
+from .models import MonthlyPostCount, Post
+
+
+def month_range(year, month):
+    """Границы месяца [начало, начало следующего) в текущем часовом поясе."""
+    if not 1 <= month <= 12 or not 1 <= year <= 9998:
+        raise Http404('Такого месяца нет.')
+    start = timezone.make_aware(datetime(year, month, 1))
+    if month == 12:
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+    else:
+        end = timezone.make_aware(datetime(year, month + 1, 1))
+    return start, end
+
+
+def post_scopes(author_id, group_id):
+    scopes = [(MonthlyPostCount.SITE, 0), (MonthlyPostCount.AUTHOR, author_id)]
+    if group_id is not None:
+        scopes.append((MonthlyPostCount.GROUP, group_id))
+    return scopes
+
+
+def change_bucket(scope, object_id, year, month, delta):
+    bucket = {
+        'scope': scope,
+        'object_id': object_id,
+        'year': year,
+        'month': month,
+    }
+    buckets = MonthlyPostCount.objects.filter(**bucket)
+    if delta < 0:
+        buckets.filter(count__gte=-delta).update(count=F('count') + delta)
+        return
+    if buckets.update(count=F('count') + delta):
+        return
+    _, created = MonthlyPostCount.objects.get_or_create(
+        defaults={'count': delta}, **bucket
+    )
+    if not created:
+        buckets.update(count=F('count') + delta)
+
+
+def change_month_counts(pub_date, scopes, delta):
+    local = timezone.localtime(pub_date)
+    for scope, object_id in scopes:
+        change_bucket(scope, object_id, local.year, local.month, delta)
+
+
+def move_posts_to_group(post_ids, group_id):
+    """Переносит посты в группу одним UPDATE с пересчетом месяцев групп."""
+    moved = Post.objects.filter(pk__in=post_ids).exclude(group_id=group_id)
+    with transaction.atomic():
+        deltas = Counter()
+        rows = moved.values_list('pub_date', 'group_id')
+        for pub_date, old_group_id in rows:
+            local = timezone.localtime(pub_date)
+            if old_group_id is not None:
+                deltas[old_group_id, local.year, local.month] -= 1
+            if group_id is not None:
+                deltas[group_id, local.year, local.month] += 1
+        updated = moved.update(group_id=group_id)
+        for (object_id, year, month), delta in deltas.items():
+            if delta:
+                change_bucket(
+                    MonthlyPostCount.GROUP, object_id, year, month, delta
+                )
+    post_cache.invalidate_values(post_ids)
+    group_ids = {object_id for object_id, _, _ in deltas}
+    purge_tags(
+        'posts', FEED_TAG.format('posts'),
+        *(f'group:{object_id}' for object_id in group_ids),
+        *(FEED_TAG.format(f'group:{object_id}') for object_id in group_ids),
+        *(f'post:{pk}' for pk in post_ids),
+    )
+    return updated
+
+
+def month_counts(scope, object_id=0):
+    return MonthlyPostCount.objects.filter(
+        scope=scope,
+        object_id=object_id,
+        count__gt=0,
+    )
@@ -0,0 +1,187 @@
+import threading
+from contextlib import contextmanager
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+
+from .lookups import cold_post_cache, post_cache, user_cache
+from .models import (
+    ColdComment, ColdPost, ColdPostTag, Comment, LikeCounter, Post, PostTag,
+)
+from .sitemaps import invalidate_shard, shard_of
+from .utils import pk_chunks
+
+ARCHIVE_VERSION_KEY = 'archive_version'
+
+COLD_COUNT_KEY = 'cold_count:{}:{}'
+
+_state = threading.local()
+
+
+def archiving_in_progress():
+    """Удаление идет при архивации: счетчики и карту сайта не трогаем."""
+    return getattr(_state, 'archiving', False)
+
+
+@contextmanager
+def archiving():
+    _state.archiving = True
+    try:
+        yield
+    finally:
+        _state.archiving = False
+
+
+class TieredList:
+    """Горячие посты, а за ними архив: для Paginator это один список.
+
+    В архив уходят только посты старше порога, поэтому при сортировке по
+    убыванию даты архив целиком идет после горячей таблицы. Архив меняется
+    только при архивации, и его размер берется из кеша — если выборка не
+    зависит от других таблиц (cache_cold_count).
+    """
+
+    def __init__(self, hot, cold, cache_cold_count=True):
+        self.hot = hot
+        self.cold = cold
+        self.cache_cold_count = cache_cold_count
+
+    @cached_property
+    def hot_count(self):
+        return self.hot.count()
+
+    def cold_count(self):
+        if not self.cache_cold_count:
+            return self.cold.count()
+        version = cache.get_or_set(ARCHIVE_VERSION_KEY, 0, None)
+        query = md5(str(self.cold.query).encode()).hexdigest()
+        return cache.get_or_set(
+            COLD_COUNT_KEY.format(version, query),
+            self.cold.count,
+            settings.ARCHIVE_COUNT_TIMEOUT,
+        )
+
+    def count(self):
+        return self.hot_count + self.cold_count()
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        objects = []
+        if start < self.hot_count:
+            objects += self.hot[start:min(stop, self.hot_count)]
+        if stop > self.hot_count:
+            objects += self.cold[
+                max(start - self.hot_count, 0):stop - self.hot_count
+            ]
+        return objects
+
+
+def get_post_or_404(post_id):
+    """Пост из горячей таблицы, а если его там нет — из архива.
+
+    Пост и автор читаются из кеша объектов, автор подставляется отдельно,
+    чтобы правка пользователя не требовала сбрасывать его посты.
+    """
+    post = post_cache.get(post_id) or cold_post_cache.get(post_id)
+    author = user_cache.get(post.author_id) if post else None
+    if author is None or not author.is_active:
+        raise Http404('Пост не найден.')
+    post.author = author
+    return post
+
+
+def get_comment_or_404(post_id, comment_id):
+    comment = Comment.objects.select_related('author', 'post').filter(
+        pk=comment_id, post_id=post_id, post__author__is_active=True,
+    ).first()
+    if comment is not None:
+        return comment
+    return get_object_or_404(
+        ColdComment.objects.select_related('author', 'post'),
+        pk=comment_id,
+        post_id=post_id,
+        post__author__is_active=True,
+    )
+
+
+def archive_chunk(post_ids):
+    """Копирует посты с комментариями и хештегами в архив и удаляет
+    оригиналы. Дневные счетчики хештегов не меняются: пост остается в
+    ленте хештега.
+
+    Несвернутые шарды лайков складываются в likes_count: архивный пост
+    только читается, и отдельные лайки ему больше не нужны.
+    """
+    pending = dict(LikeCounter.objects.filter(
+        post_id__in=post_ids,
+    ).order_by().values('post').annotate(
+        total=Sum('count'),
+    ).values_list('post', 'total'))
+    with transaction.atomic(), archiving():
+        ColdPost.objects.bulk_create(
+            ColdPost(
+                id=post.pk,
+                text=post.text,
+                pub_date=post.pub_date,
+                author_id=post.author_id,
+                group_id=post.group_id,
+                image=post.image.name,
+                likes_count=post.likes_count + pending.get(post.pk, 0),
+                views_count=post.views_count,
+            )
+            for post in Post.objects.filter(pk__in=post_ids)
+        )
+        ColdComment.objects.bulk_create(
+            ColdComment(
+                id=comment.pk,
+                post_id=comment.post_id,
+                author_id=comment.author_id,
+                text=comment.text,
+                created=comment.created,
+                parent_id=comment.parent_id,
+                path=comment.path,
+                depth=comment.depth,
+                replies_count=comment.replies_count,
+            )
+            for comment in Comment.objects.filter(
+                post_id__in=post_ids,
+            ).order_by('path')
+        )
+        ColdPostTag.objects.bulk_create(
+            ColdPostTag(
+                tag_id=link.tag_id, post_id=link.post_id,
+                pub_date=link.pub_date,
+            )
+            for link in PostTag.objects.filter(post_id__in=post_ids)
+        )
+        Post.objects.filter(pk__in=post_ids).delete()
+
+
+def bump_archive_version():
+    """Сбрасывает закешированные размеры архивных выборок."""
+    try:
+        cache.incr(ARCHIVE_VERSION_KEY)
+    except ValueError:
+        cache.set(ARCHIVE_VERSION_KEY, 1, None)
+
+
+def archive_posts(before, batch_size):
+    """Переносит посты старше before в архив порциями по batch_size."""
+    moved = 0
+    posts = Post.objects.filter(pub_date__lt=before)
+    for post_ids in pk_chunks(posts, batch_size):
+        archive_chunk(post_ids)
+        cold_post_cache.invalidate_values(post_ids)
+        for pk in {shard_of(pk): pk for pk in post_ids}.values():
+            invalidate_shard('posts', pk)
+            invalidate_shard('archive', pk)
+        moved += len(post_ids)
+    if moved:
+        bump_archive_version()
+    return moved
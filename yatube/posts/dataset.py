@@ -0,0 +1,359 @@
+import multiprocessing
+import os
+import shutil
+from collections import Counter
+from datetime import timedelta
+from random import Random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from core.pagecache import purge_tags
+from .archive import change_bucket
+from .coldstore import bump_archive_version
+from .feeds import FEED_TAG
+from .models import (
+    ColdComment, ColdPost, Comment, FeedState, Follow, Group,
+    MonthlyPostCount, Post, User
+)
+
+# Шаг псевдоперестановки ранг -> id: простое число, чтобы популярные
+# авторы и посты были разбросаны по всему диапазону id.
+SCATTER_STRIDE = 1_000_003
+
+PLACEHOLDERS = 8
+
+TEXT_POOL = 2000
+
+NAME_POOL = 500
+
+_plan = None
+
+
+def zipf_rank(rng, size, alpha):
+    """Ранг 0..size-1 по степенному закону без таблицы весов.
+
+    Обратная функция распределения непрерывного закона Ципфа: ранг 0
+    выпадает чаще всех, хвост длинный.
+    """
+    u = rng.random()
+    if alpha == 1:
+        rank = size ** u
+    else:
+        rank = ((size ** (1 - alpha) - 1) * u + 1) ** (1 / (1 - alpha))
+    return min(int(rank) - 1, size - 1)
+
+
+def scatter(rank, size):
+    if size % SCATTER_STRIDE == 0:
+        return rank
+    return rank * SCATTER_STRIDE % size
+
+
+def insert_sql(model, fields):
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(field).column) for field in fields
+    )
+    values = ', '.join(['%s'] * len(fields))
+    return (
+        f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+        f'VALUES ({values})'
+    )
+
+
+def top_pk(*models):
+    """Наибольший id по всем таблицам: у горячих и архивных строк id
+    общие."""
+    return max(
+        model._default_manager.aggregate(top=Max('pk'))['top'] or 0
+        for model in models
+    )
+
+
+def write_rows(model, fields, rows, batch_size):
+    """executemany пачками по batch_size, каждая в своей транзакции."""
+    sql = insert_sql(model, fields)
+    for start in range(0, len(rows), batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+class DatasetPlan:
+    """Параметры генерации и производные от них границы id.
+
+    Каждая порция строк получает свой Random от (seed, вид, начало),
+    поэтому результат не зависит от числа процессов.
+    """
+
+    def __init__(self, users, groups, posts, comments, follows, images,
+                 alpha, days, seed, batch_size):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.images = images
+        self.alpha = alpha
+        self.seed = seed
+        self.batch_size = batch_size
+        self.user_base = top_pk(User)
+        self.group_base = top_pk(Group)
+        self.post_base = top_pk(Post, ColdPost)
+        self.comment_base = top_pk(Comment, ColdComment)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.password = make_password(None)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.texts = [fake.sentence(nb_words=12) for _ in range(TEXT_POOL)]
+        self.first_names = [fake.first_name() for _ in range(NAME_POOL)]
+        self.last_names = [fake.last_name() for _ in range(NAME_POOL)]
+
+    def rng(self, kind, start):
+        return Random(f'{self.seed}:{kind}:{start}')
+
+    def user_id(self, rng):
+        return self.user_base + 1 + scatter(
+            zipf_rank(rng, self.users, self.alpha), self.users
+        )
+
+    def post_date(self, index):
+        return self.start + (self.now - self.start) * index / self.posts
+
+    def text(self, rng):
+        return ' '.join(
+            rng.choice(self.texts) for _ in range(rng.randint(1, 4))
+        )
+
+
+def users_chunk(plan, start, end):
+    rng = plan.rng('users', start)
+    adapt = connection.ops.adapt_datetimefield_value
+    joined = adapt(plan.start)
+    rows = [
+        (
+            plan.user_base + index + 1, plan.password, False,
+            f'load_{plan.user_base + index + 1}',
+            rng.choice(plan.first_names), rng.choice(plan.last_names),
+            '', False, True, joined,
+        )
+        for index in range(start, end)
+    ]
+    write_rows(User, (
+        'id', 'password', 'is_superuser', 'username', 'first_name',
+        'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+    ), rows, plan.batch_size)
+    return Counter()
+
+
+def groups_chunk(plan, start, end):
+    rng = plan.rng('groups', start)
+    rows = [
+        (
+            plan.group_base + index + 1, f'Сообщество {index + 1}',
+            f'load-{plan.group_base + index + 1}', plan.text(rng), False,
+        )
+        for index in range(start, end)
+    ]
+    write_rows(
+        Group, ('id', 'title', 'slug', 'description', 'is_deleted'),
+        rows, plan.batch_size,
+    )
+    return Counter()
+
+
+def posts_chunk(plan, start, end):
+    """Посты с авторами по степенному закону; возвращает счетчики месяцев."""
+    rng = plan.rng('posts', start)
+    adapt = connection.ops.adapt_datetimefield_value
+    months = Counter()
+    rows = []
+    for index in range(start, end):
+        author_id = plan.user_id(rng)
+        group_id = None
+        if plan.groups and rng.random() < 0.6:
+            group_id = plan.group_base + 1 + scatter(
+                zipf_rank(rng, plan.groups, plan.alpha), plan.groups
+            )
+        image = ''
+        if rng.random() < plan.images:
+            image = f'posts/placeholder-{rng.randrange(PLACEHOLDERS)}.jpg'
+        pub_date = plan.post_date(index)
+        rows.append((
+            plan.post_base + index + 1, plan.text(rng), adapt(pub_date),
+            author_id, group_id, image, 0, 0,
+        ))
+        local = timezone.localtime(pub_date)
+        for scope, object_id in (
+            (MonthlyPostCount.SITE, 0),
+            (MonthlyPostCount.AUTHOR, author_id),
+            (MonthlyPostCount.GROUP, group_id),
+        ):
+            if object_id is not None:
+                months[scope, object_id, local.year, local.month] += 1
+    write_rows(Post, (
+        'id', 'text', 'pub_date', 'author', 'group', 'image',
+        'likes_count', 'views_count',
+    ), rows, plan.batch_size)
+    return months
+
+
+def comments_chunk(plan, start, end):
+    """Комментарии верхнего уровня, сгущенные на горячих постах."""
+    rng = plan.rng('comments', start)
+    adapt = connection.ops.adapt_datetimefield_value
+    rows = []
+    for index in range(start, end):
+        post_index = scatter(
+            zipf_rank(rng, plan.posts, plan.alpha), plan.posts
+        )
+        created = min(
+            plan.post_date(post_index)
+            + timedelta(seconds=rng.randrange(3 * 24 * 60 * 60)),
+            plan.now,
+        )
+        pk = plan.comment_base + index + 1
+        rows.append((
+            pk, plan.post_base + post_index + 1, plan.user_id(rng),
+            plan.text(rng), adapt(created), f'{pk:0{Comment.PATH_STEP}d}/',
+            0, 0,
+        ))
+    write_rows(Comment, (
+        'id', 'post', 'author', 'text', 'created', 'path', 'depth',
+        'replies_count',
+    ), rows, plan.batch_size)
+    return Counter()
+
+
+def follows_chunk(plan, start, end):
+    """Подписки: число у читателя и популярность авторов с тяжелым хвостом."""
+    rng = plan.rng('follows', start)
+    rows = []
+    for index in range(start, end):
+        user_id = plan.user_base + index + 1
+        wanted = min(
+            int(plan.follows * rng.paretovariate(1.5) / 3), plan.users - 1
+        )
+        authors = set()
+        for _ in range(wanted * 2):
+            if len(authors) >= wanted:
+                break
+            author_id = plan.user_id(rng)
+            if author_id != user_id:
+                authors.add(author_id)
+        rows.extend((user_id, author_id) for author_id in sorted(authors))
+    write_rows(Follow, ('user', 'author'), rows, plan.batch_size)
+    return Counter()
+
+
+def run_chunk(task):
+    func, start, end = task
+    return func(_plan, start, end)
+
+
+def chunks(func, total, size):
+    return [
+        (func, start, min(start + size, total))
+        for start in range(0, total, size)
+    ]
+
+
+def write_placeholders(plan):
+    rng = plan.rng('images', 0)
+    folder = os.path.join(settings.MEDIA_ROOT, 'posts')
+    os.makedirs(folder, exist_ok=True)
+    for number in range(PLACEHOLDERS):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (960, 339), color).save(
+            os.path.join(folder, f'placeholder-{number}.jpg')
+        )
+
+
+def finish(plan, months):
+    """Досчитывает то, что при обычной записи делают сигналы.
+
+    Новые посты принадлежат только новым авторам и группам, поэтому из
+    кешей устаревают лишь общие ленты и размеры выборок.
+    """
+    existing = set(MonthlyPostCount.objects.values_list(
+        'scope', 'object_id', 'year', 'month'
+    ))
+    for key in existing & months.keys():
+        change_bucket(*key, months.pop(key))
+    MonthlyPostCount.objects.bulk_create(
+        (
+            MonthlyPostCount(
+                scope=scope, object_id=object_id,
+                year=year, month=month, count=count,
+            )
+            for (scope, object_id, year, month), count in months.items()
+        ),
+    )
+    last_seen = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    FeedState.objects.bulk_create(
+        (
+            FeedState(user_id=user_id, last_seen_post_id=last_seen)
+            for user_id in Follow.objects.filter(
+                user_id__gt=plan.user_base,
+            ).order_by().values_list('user_id', flat=True).distinct()
+        ),
+    )
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post, Comment, Follow]
+        ):
+            cursor.execute(sql)
+    # Версии в общем кеше: страницы и размеры выборок сбросятся и у
+    # запущенных серверов, а не только в процессе команды.
+    purge_tags('posts', FEED_TAG.format('posts'))
+    bump_archive_version()
+    shutil.rmtree(settings.SITEMAP_ROOT, ignore_errors=True)
+
+
+def generate(plan, workers, progress=None):
+    """Пишет набор по фазам: пользователи и группы, посты, затем
+    комментарии и подписки. Порции одной фазы идут в workers процессов.
+
+    SQLite не выдерживает параллельной записи, для него workers = 1.
+    """
+    global _plan
+    _plan = plan
+    if connection.vendor == 'sqlite':
+        workers = 1
+    if plan.images:
+        write_placeholders(plan)
+    size = plan.batch_size * 4
+    phases = (
+        ('пользователи', chunks(users_chunk, plan.users, size)
+         + chunks(groups_chunk, plan.groups, size)),
+        ('посты', chunks(posts_chunk, plan.posts, size)),
+        ('комментарии и подписки', chunks(comments_chunk, plan.comments, size)
+         + chunks(follows_chunk, plan.users, size)),
+    )
+    months = Counter()
+    pool = None
+    if workers > 1:
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+    try:
+        for name, tasks in phases:
+            results = (
+                pool.imap_unordered(run_chunk, tasks) if pool
+                else map(run_chunk, tasks)
+            )
+            for result in results:
+                months.update(result)
+            if progress:
+                progress(name)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    finish(plan, months)
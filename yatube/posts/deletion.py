@@ -0,0 +1,122 @@
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from sorl.thumbnail import delete as delete_image
+
+from core.pagecache import purge_tags
+from .feeds import FEED_TAG
+from .likes import change_likes
+from .lookups import cold_post_cache, post_cache
+from .models import (
+    ColdComment, ColdPost, Comment, DeletionJob, Follow, Group, Like,
+    MonthlyPostCount, Post, User
+)
+
+
+post_caches = {Post: post_cache, ColdPost: cold_post_cache}
+
+
+def schedule_deletion(obj):
+    """Сразу прячет пользователя или группу, строки удалит process_deletions.
+
+    Каскад на тысячи строк в одной транзакции надолго блокирует SQLite,
+    поэтому сам объект удаляется последним, когда зависимых строк не
+    останется.
+    """
+    with transaction.atomic():
+        if isinstance(obj, Group):
+            obj.is_deleted = True
+            obj.save(update_fields=('is_deleted',))
+            kind = DeletionJob.GROUP
+        else:
+            obj.is_active = False
+            obj.save(update_fields=('is_active',))
+            kind = DeletionJob.USER
+        DeletionJob.objects.get_or_create(kind=kind, object_id=obj.pk)
+
+
+def remove_images(names):
+    for name in names:
+        delete_image(name)
+
+
+def first_pks(queryset, batch_size):
+    return list(queryset.order_by('pk').values_list(
+        'pk', flat=True
+    )[:batch_size])
+
+
+def delete_batch(queryset, batch_size):
+    """Удаляет одну порцию; картинки постов стираются после коммита."""
+    pks = first_pks(queryset, batch_size)
+    model = queryset.model
+    with transaction.atomic():
+        if model in (Post, ColdPost):
+            images = [
+                name for name in model.objects.filter(
+                    pk__in=pks,
+                ).values_list('image', flat=True) if name
+            ]
+            transaction.on_commit(partial(remove_images, images))
+        model.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def delete_likes_batch(queryset, batch_size):
+    """Снимает лайки так же, как unlike: со сдвигом шардов счетчика."""
+    pks = first_pks(queryset, batch_size)
+    with transaction.atomic():
+        likes = Counter(Like.objects.filter(
+            pk__in=pks,
+        ).values_list('post_id', flat=True))
+        for post_id, count in likes.items():
+            change_likes(post_id, -count)
+        Like.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def ungroup_batch(queryset, batch_size):
+    pks = first_pks(queryset, batch_size)
+    posts = queryset.model.objects.filter(pk__in=pks)
+    group_ids = set(posts.values_list('group_id', flat=True))
+    posts.update(group=None)
+    post_caches[queryset.model].invalidate_values(pks)
+    purge_tags('posts', FEED_TAG.format('posts'), *(
+        FEED_TAG.format(f'group:{group_id}') for group_id in group_ids
+    ), *(f'post:{pk}' for pk in pks))
+    return len(pks)
+
+
+def deletion_steps(job):
+    """Порции работы по задаче: (выборка, функция одной порции)."""
+    if job.kind == DeletionJob.GROUP:
+        return (
+            (Post.objects.filter(group_id=job.object_id), ungroup_batch),
+            (ColdPost.objects.filter(group_id=job.object_id), ungroup_batch),
+            (MonthlyPostCount.objects.filter(
+                scope=MonthlyPostCount.GROUP, object_id=job.object_id,
+            ), delete_batch),
+        )
+    return (
+        (Follow.objects.filter(
+            Q(user_id=job.object_id) | Q(author_id=job.object_id)
+        ), delete_batch),
+        (Like.objects.filter(user_id=job.object_id), delete_likes_batch),
+        (Comment.objects.filter(author_id=job.object_id), delete_batch),
+        (ColdComment.objects.filter(author_id=job.object_id), delete_batch),
+        (Post.objects.filter(author_id=job.object_id), delete_batch),
+        (ColdPost.objects.filter(author_id=job.object_id), delete_batch),
+    )
+
+
+def run_deletion_job(job, batch_size):
+    """Доводит задачу до конца порциями, каждая в своей транзакции."""
+    for queryset, run_batch in deletion_steps(job):
+        while run_batch(queryset, batch_size) == batch_size:
+            pass
+    model = Group if job.kind == DeletionJob.GROUP else User
+    with transaction.atomic():
+        model.objects.filter(pk=job.object_id).delete()
+        job.delete()
@@ -0,0 +1,165 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+
+from core.cache import get_or_compute
+from core.pagecache import tag_versions
+from .lookups import get_author_or_404, get_group_or_404
+from .models import Group, Post, User
+
+FEED_TAG = 'feed:{}'
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:index')
+    description = 'Новые записи всех авторов'
+
+    def scope_posts(self, **kwargs):
+        return Post.objects.visible()
+
+    def scope_tag(self, **kwargs):
+        """Тег версии ленты: его сбрасывают сигналы при правке и
+        удалении постов, см. posts.signals.post_feeds_changed."""
+        return FEED_TAG.format('posts')
+
+    def items(self):
+        return Post.objects.visible().select_related(
+            'author', 'group'
+        )[:settings.FEED_ITEMS]
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def scope_posts(self, slug):
+        return Post.objects.visible().filter(group__slug=slug)
+
+    def scope_tag(self, slug):
+        return FEED_TAG.format(f'group:{get_group_or_404(slug).pk}')
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug, is_deleted=False)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def description(self, group):
+        return group.description
+
+    def items(self, group):
+        return group.posts.visible().select_related(
+            'author'
+        )[:settings.FEED_ITEMS]
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def scope_posts(self, username):
+        return Post.objects.visible().filter(author__username=username)
+
+    def scope_tag(self, username):
+        """404 для удаленного автора до проверки ETag и кеша."""
+        return FEED_TAG.format(f'author:{get_author_or_404(username).pk}')
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username, is_active=True)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def description(self, author):
+        return f'Записи пользователя {author.username}'
+
+    def items(self, author):
+        return author.posts.visible().select_related(
+            'author', 'group'
+        )[:settings.FEED_ITEMS]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+def render_feed(feed, request, kwargs):
+    response = feed(request, **kwargs)
+    return response.content, response['Content-Type']
+
+
+def cached_feed(feed):
+    """Ответ ленты из кеша с ETag и Last-Modified.
+
+    ETag и ключ кеша складываются из id последнего поста и версии тега
+    ленты, которая меняется при правке и удалении любого ее поста.
+    Проверка свежести стоит одного индексного запроса, поэтому клиенты,
+    опрашивающие ленту, почти всегда получают 304 или попадание в кеш.
+    """
+    def view(request, **kwargs):
+        tag = feed.scope_tag(**kwargs)
+        version = tag_versions([tag])[tag]
+        latest = feed.scope_posts(**kwargs).order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', 'pub_date').first()
+        latest_pk, last_modified = latest or (0, None)
+        scope = hashlib.md5(request.path.encode()).hexdigest()
+        headers = HttpResponse()
+        headers['ETag'] = f'"{scope}-{latest_pk}-{version}"'
+        if last_modified is not None:
+            last_modified = timegm(last_modified.utctimetuple())
+            headers['Last-Modified'] = http_date(last_modified)
+        not_modified = get_conditional_response(
+            request,
+            etag=headers['ETag'],
+            last_modified=last_modified,
+            response=headers,
+        )
+        if not_modified is not headers:
+            return not_modified
+        key = f'feed:{scope}:{latest_pk}:{version}'
+        content, content_type = get_or_compute(
+            key,
+            lambda: render_feed(feed, request, kwargs),
+            settings.FEED_CACHE_TIMEOUT,
+        )
+        headers.content = content
+        headers['Content-Type'] = content_type
+        return headers
+    return view
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max
+
+from core.cache import cache_is_shared
+from core.pagecache import purge_tags, tag_versions
+from .models import FeedState, Follow, Post
+
+UNSEEN_KEY = 'feed_unseen:{}:{}'
+
+# Версия всех счетчиков сразу: новый пост сбрасывает ее одной записью,
+# а не ключом на каждого подписчика автора.
+UNSEEN_TAG = 'feed_unseen'
+
+
+def unseen_key(user_id):
+    return UNSEEN_KEY.format(user_id, tag_versions([UNSEEN_TAG])[UNSEEN_TAG])
+
+
+def stored_unseen(user_id):
+    return FeedState.objects.filter(user_id=user_id).values_list(
+        'unseen_count', flat=True
+    ).first() or 0
+
+
+def unseen_count(user):
+    """Число новых постов в ленте подписок: два чтения из кеша.
+
+    На локальном кеше воркера - запрос к БД: сброс версии и счетчика
+    в одном процессе не дошел бы до остальных.
+    """
+    if not user.is_authenticated:
+        return 0
+    if not cache_is_shared():
+        return stored_unseen(user.pk)
+    key = unseen_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = stored_unseen(user.pk)
+        cache.set(key, count, settings.UNSEEN_CACHE_TIMEOUT)
+    return count
+
+
+def forget_unseen(user_id):
+    cache.delete(unseen_key(user_id))
+
+
+def change_unseen(post, delta):
+    """Сдвигает счетчик подписчиков автора, еще не видевших пост."""
+    states = FeedState.objects.filter(
+        user_id__in=Follow.objects.filter(
+            author_id=post.author_id,
+        ).values('user_id'),
+        last_seen_post_id__lt=post.pk,
+    )
+    if delta < 0:
+        states = states.filter(unseen_count__gt=0)
+    if states.update(unseen_count=F('unseen_count') + delta):
+        purge_tags(UNSEEN_TAG)
+
+
+def recount_unseen(user_id):
+    """Пересчитывает счетчик целиком: нужно только при смене подписок."""
+    state, _ = FeedState.objects.get_or_create(user_id=user_id)
+    state.unseen_count = Post.objects.filter(
+        author__following__user_id=user_id,
+        pk__gt=state.last_seen_post_id,
+    ).count()
+    state.save(update_fields=('unseen_count',))
+    forget_unseen(user_id)
+
+
+def mark_seen(user):
+    """Поднимает отметку до самого нового поста ленты и обнуляет счетчик."""
+    if not unseen_count(user):
+        return
+    last_seen = Post.objects.filter(
+        author__following__user=user,
+    ).aggregate(last=Max('pk'))['last'] or 0
+    FeedState.objects.update_or_create(
+        user=user,
+        defaults={'last_seen_post_id': last_seen, 'unseen_count': 0},
+    )
+    forget_unseen(user.pk)
@@ -0,0 +1,105 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Exists, F, IntegerField, OuterRef, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
+
+from .models import Like, LikeCounter, Post
+
+
+def change_likes(post_id, delta):
+    """Меняет случайный шард: одновременные лайки не ждут одну строку."""
+    shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+    counters = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if counters.update(count=F('count') + delta):
+        return
+    _, created = LikeCounter.objects.get_or_create(
+        post_id=post_id, shard=shard, defaults={'count': delta}
+    )
+    if not created:
+        counters.update(count=F('count') + delta)
+
+
+def like(user, post):
+    try:
+        with transaction.atomic():
+            Like.objects.create(user=user, post=post)
+            change_likes(post.pk, 1)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unlike(user, post):
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        if deleted:
+            change_likes(post.pk, -1)
+    return bool(deleted)
+
+
+def like_stats(post_ids, user):
+    """{id поста: (число лайков, лайкнул ли user)} одним запросом."""
+    pending = LikeCounter.objects.filter(
+        post=OuterRef('pk'),
+    ).order_by().values('post').annotate(total=Sum('count')).values('total')
+    posts = Post.objects.filter(pk__in=post_ids).annotate(
+        total=F('likes_count') + Coalesce(
+            Subquery(pending, output_field=IntegerField()), Value(0)
+        ),
+    )
+    if user.is_authenticated:
+        posts = posts.annotate(liked=Exists(
+            Like.objects.filter(post=OuterRef('pk'), user_id=user.pk)
+        ))
+    else:
+        posts = posts.annotate(liked=Value(False, IntegerField()))
+    return {
+        pk: (total, bool(liked))
+        for pk, total, liked in posts.values_list('pk', 'total', 'liked')
+    }
+
+
+def attach_likes(posts, user):
+    """Проставляет like_total и liked всем постам страницы."""
+    posts = list(posts)
+    stats = like_stats([post.pk for post in posts], user)
+    for post in posts:
+        post.like_total, post.liked = stats.get(
+            post.pk, (post.likes_count, False)
+        )
+    return posts
+
+
+def fold_like_counters(batch_size, after=0, up_to=None):
+    """Переносит суммы шардов в Post.likes_count для следующих batch_size
+    постов с id больше after и не больше up_to; возвращает их id.
+
+    Шард уменьшается на прочитанное значение, а не удаляется, поэтому
+    лайки, пришедшие во время свертки, не теряются.
+    """
+    counters = LikeCounter.objects.filter(post_id__gt=after)
+    if up_to is not None:
+        counters = counters.filter(post_id__lte=up_to)
+    post_ids = list(counters.order_by('post_id').values_list(
+        'post_id', flat=True
+    ).distinct()[:batch_size])
+    for post_id in post_ids:
+        with transaction.atomic():
+            shards = list(LikeCounter.objects.filter(
+                post_id=post_id,
+            ).values_list('pk', 'count'))
+            Post.objects.filter(pk=post_id).update(
+                likes_count=F('likes_count') + sum(
+                    count for _, count in shards
+                )
+            )
+            for pk, count in shards:
+                LikeCounter.objects.filter(pk=pk).update(
+                    count=F('count') - count
+                )
+            LikeCounter.objects.filter(post_id=post_id, count=0).delete()
+    return post_ids
@@ -0,0 +1,24 @@
+from django.http import Http404
+
+from core.objcache import ObjectCache
+from .models import ColdPost, Group, Post, User
+
+post_cache = ObjectCache(Post)
+cold_post_cache = ObjectCache(ColdPost)
+group_cache = ObjectCache(Group, 'slug')
+user_cache = ObjectCache(User)
+username_cache = ObjectCache(User, 'username')
+
+
+def get_group_or_404(slug):
+    group = group_cache.get(slug)
+    if group is None or group.is_deleted:
+        raise Http404('Группа не найдена.')
+    return group
+
+
+def get_author_or_404(username):
+    author = username_cache.get(username)
+    if author is None or not author.is_active:
+        raise Http404('Пользователь не найден.')
+    return author
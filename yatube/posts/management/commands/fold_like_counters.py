@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.likes import fold_like_counters
+from posts.models import LikeCounter
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает шарды счетчиков лайков в Post.likes_count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LIKE_FOLD_BATCH_SIZE,
+            help='Сколько постов обрабатывать за проход',
+        )
+
+    def handle(self, *args, **options):
+        # Один проход по постам, у которых были шарды на момент запуска:
+        # шарды постов, появившиеся позже, свернет следующий запуск.
+        up_to = LikeCounter.objects.aggregate(top=Max('post_id'))['top']
+        after = 0
+        total = 0
+        while up_to is not None:
+            post_ids = fold_like_counters(options['batch_size'], after, up_to)
+            if not post_ids:
+                break
+            after = post_ids[-1]
+            total += len(post_ids)
+        self.stdout.write(f'Свернуто счетчиков постов: {total}')
@@ -0,0 +1,87 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import cache_is_shared
+from posts.dataset import DatasetPlan, generate
+
+
+class Command(BaseCommand):
+    help = 'Генерирует реалистичный набор данных для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее число подписок у пользователя',
+        )
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0,
+            help='Доля постов с картинкой-заглушкой, от 0 до 1',
+        )
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=1.2,
+            help='Показатель степенного закона активности и популярности',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить посты',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Сколько процессов пишут в базу',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк вставлять одним executemany',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Комментариям нужны посты')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images задается долей от 0 до 1')
+        started = time.monotonic()
+        plan = DatasetPlan(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'], options['images'],
+            options['alpha'], options['days'], options['seed'],
+            options['batch_size'],
+        )
+
+        def progress(phase):
+            self.stdout.write(
+                f'Готово: {phase} ({time.monotonic() - started:.1f} с)'
+            )
+
+        generate(plan, options['workers'], progress)
+        self.stdout.write(
+            f"Создано пользователей: {options['users']}, "
+            f"групп: {options['groups']}, постов: {options['posts']}, "
+            f"комментариев: {options['comments']} "
+            f'за {time.monotonic() - started:.1f} с'
+        )
+        if not cache_is_shared():
+            self.stderr.write(
+                'Кеш локален для процесса: перезапустите запущенные '
+                'серверы, иначе они отдадут страницы без новых данных'
+            )
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.deletion import run_deletion_job
+from posts.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = 'Порциями удаляет пользователей и группы, помеченные на удаление'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.DELETION_BATCH_SIZE,
+            help='Сколько строк удалять в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        done = 0
+        for job in DeletionJob.objects.all():
+            run_deletion_job(job, options['batch_size'])
+            self.stdout.write(f'Удалено: {job}')
+            done += 1
+        self.stdout.write(f'Выполнено задач: {done}')
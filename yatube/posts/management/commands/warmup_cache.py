@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.cache import cache_is_shared
+from posts.warmup import warm, warmup_urls
+
+
+class Command(BaseCommand):
+    help = 'Прогревает кеши популярных страниц после деплоя или сброса'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=settings.WARMUP_PAGES,
+            help='Сколько первых страниц ленты прогреть',
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=settings.WARMUP_PROFILES,
+            help='Сколько профилей самых активных авторов прогреть',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=settings.WARMUP_POSTS,
+            help='Сколько самых просматриваемых постов прогреть',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.WARMUP_CONCURRENCY,
+            help='Сколько страниц рендерить одновременно',
+        )
+        parser.add_argument(
+            '--url',
+            default=settings.WARMUP_URL,
+            help='Адрес запущенного сервера, чьи кеши нужно прогреть',
+        )
+        parser.add_argument(
+            '--host',
+            default=None,
+            help='Заголовок Host: от него зависит ключ кеша страниц; '
+                 'по умолчанию - из --url',
+        )
+
+    def handle(self, *args, **options):
+        urls = warmup_urls(
+            options['pages'], options['profiles'], options['posts']
+        )
+        if not cache_is_shared():
+            self.stderr.write(
+                'Кеш локален для процесса: прогреются только воркеры, '
+                'принявшие запросы прогрева'
+            )
+        results = warm(
+            urls, options['url'], options['host'], options['concurrency']
+        )
+        for url, status, seconds in results:
+            if options['verbosity'] > 1 or status != 200:
+                self.stdout.write(f'{status} {seconds * 1000:.0f} мс {url}')
+        total = sum(seconds for _, _, seconds in results)
+        slowest = max(results, key=lambda result: result[2], default=None)
+        self.stdout.write(
+            f'Прогрето страниц: {len(results)} за {total:.2f} с'
+        )
+        if slowest is not None:
+            self.stdout.write(
+                f'Самая долгая: {slowest[0]} ({slowest[2] * 1000:.0f} мс)'
+            )
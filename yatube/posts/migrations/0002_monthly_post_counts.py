@@ -0,0 +1,86 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def fill_monthly_post_counts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MonthlyPostCount = apps.get_model('posts', 'MonthlyPostCount')
+    counts = {}
+    posts = Post.objects.values_list('pub_date', 'group_id', 'author_id')
+    for pub_date, group_id, author_id in posts.iterator():
+        local = timezone.localtime(pub_date)
+        scopes = [('s', 0), ('a', author_id)]
+        if group_id is not None:
+            scopes.append(('g', group_id))
+        for scope, object_id in scopes:
+            key = (scope, object_id, local.year, local.month)
+            counts[key] = counts.get(key, 0) + 1
+    MonthlyPostCount.objects.bulk_create(
+        MonthlyPostCount(
+            scope=scope, object_id=object_id,
+            year=year, month=month, count=count,
+        )
+        for (scope, object_id, year, month), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyPostCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('s', 'Весь сайт'), ('g', 'Группа'), ('a', 'Автор')], max_length=1, verbose_name='Область')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='ID группы или автора')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Год')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Месяц')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Количество постов за месяц',
+                'verbose_name_plural': 'Количество постов по месяцам',
+                'ordering': ('-year', '-month'),
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('-created',), 'verbose_name': 'Комментарий', 'verbose_name_plural': 'Комментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Автор, на которого подписались'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlypostcount',
+            unique_together={('scope', 'object_id', 'year', 'month')},
+        ),
+        migrations.RunPython(
+            fill_monthly_post_counts, migrations.RunPython.noop
+        ),
+    ]
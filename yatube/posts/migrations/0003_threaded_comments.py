@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    while True:
+        batch = list(
+            Comment.objects.filter(path='').only('pk').order_by('pk')[:1000]
+        )
+        if not batch:
+            return
+        for comment in batch:
+            comment.path = f'{comment.pk:010d}/'
+        Comment.objects.bulk_update(batch, ('path',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_monthly_post_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на комментарий'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=275, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ответов'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+    ]
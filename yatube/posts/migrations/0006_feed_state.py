@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max
+
+
+def fill_feed_states(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    FeedState = apps.get_model('posts', 'FeedState')
+    last_seen = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    user_ids = Follow.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    FeedState.objects.bulk_create(
+        (
+            FeedState(user_id=user_id, last_seen_post_id=last_seen)
+            for user_id in user_ids.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_post_views_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seen_post_id', models.PositiveIntegerField(default=0, verbose_name='Последний просмотренный пост')),
+                ('unseen_count', models.PositiveIntegerField(default=0, verbose_name='Новых постов')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_state', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Состояние ленты подписок',
+                'verbose_name_plural': 'Состояния лент подписок',
+            },
+        ),
+        migrations.RunPython(fill_feed_states, migrations.RunPython.noop),
+    ]
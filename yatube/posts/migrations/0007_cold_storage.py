@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_feed_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdPost',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('pub_date', models.DateTimeField(verbose_name='Время публикации')),
+                ('image', models.ImageField(blank=True, upload_to='posts/', verbose_name='Картинка')),
+                ('likes_count', models.PositiveIntegerField(default=0, verbose_name='Лайки')),
+                ('views_count', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cold_posts', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cold_posts', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Архивный пост',
+                'verbose_name_plural': 'Архивные посты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ColdComment',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField(verbose_name='Текст комментария')),
+                ('created', models.DateTimeField(verbose_name='Время публикации')),
+                ('path', models.CharField(max_length=275, verbose_name='Путь в ветке')),
+                ('depth', models.PositiveSmallIntegerField(default=0, verbose_name='Глубина')),
+                ('replies_count', models.PositiveIntegerField(default=0, verbose_name='Количество ответов')),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cold_comments', to=settings.AUTH_USER_MODEL, verbose_name='Автор комментария')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.ColdComment', verbose_name='Ответ на комментарий')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.ColdPost', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Архивный комментарий',
+                'verbose_name_plural': 'Архивные комментарии',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='coldpost',
+            index=models.Index(fields=['pub_date'], name='coldpost_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coldpost',
+            index=models.Index(fields=['group', 'pub_date'], name='coldpost_group_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coldpost',
+            index=models.Index(fields=['author', 'pub_date'], name='coldpost_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coldcomment',
+            index=models.Index(fields=['post', 'path'], name='coldcomment_post_path_idx'),
+        ),
+    ]
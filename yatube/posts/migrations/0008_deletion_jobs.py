@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_cold_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='is_deleted',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Удаляется'),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('u', 'Пользователь'), ('g', 'Группа')], max_length=1, verbose_name='Что удаляется')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID объекта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлено в очередь')),
+            ],
+            options={
+                'verbose_name': 'Задача удаления',
+                'verbose_name_plural': 'Задачи удаления',
+                'ordering': ('created',),
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+    ]
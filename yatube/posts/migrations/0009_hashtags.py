@@ -0,0 +1,97 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:44
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+HASHTAG = re.compile(r'(?<![\w&#])#(\w*[^\W\d_]\w*)')
+
+
+def fill_tags(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('posts', 'Tag')
+    PostTag = apps.get_model('posts', 'PostTag')
+    TagDailyCount = apps.get_model('posts', 'TagDailyCount')
+    tag_ids = {}
+    links = []
+    days = Counter()
+    posts = Post.objects.filter(text__contains='#').values_list(
+        'pk', 'text', 'pub_date'
+    )
+    for post_id, text, pub_date in posts.iterator():
+        names = {
+            name.lower() for name in HASHTAG.findall(text) if len(name) <= 50
+        }
+        for name in names:
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.create(name=name).pk
+            links.append(PostTag(
+                tag_id=tag_ids[name], post_id=post_id, pub_date=pub_date
+            ))
+            days[tag_ids[name], timezone.localdate(pub_date)] += 1
+    PostTag.objects.bulk_create(links)
+    TagDailyCount.objects.bulk_create(
+        TagDailyCount(tag_id=tag_id, day=day, count=count)
+        for (tag_id, day), count in days.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Хештег')),
+            ],
+            options={
+                'verbose_name': 'Хештег',
+                'verbose_name_plural': 'Хештеги',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Время публикации поста')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='posts.Post', verbose_name='Пост')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='posts.Tag', verbose_name='Хештег')),
+            ],
+            options={
+                'verbose_name': 'Хештег поста',
+                'verbose_name_plural': 'Хештеги постов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TagDailyCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_counts', to='posts.Tag', verbose_name='Хештег')),
+            ],
+            options={
+                'verbose_name': 'Количество постов с хештегом за день',
+                'verbose_name_plural': 'Количество постов с хештегами по дням',
+                'unique_together': {('tag', 'day')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', 'pub_date', 'post'], name='posttag_tag_pub_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together={('tag', 'post')},
+        ),
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:07
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+HASHTAG = re.compile(r'(?<![\w&#])#(\w*[^\W\d_]\w*)')
+
+
+def fill_cold_tags(apps, schema_editor):
+    """Индексирует уже архивные посты: их строки PostTag удалил каскад.
+
+    Дневные счетчики не трогаются: архивные посты старше окна трендов.
+    """
+    ColdPost = apps.get_model('posts', 'ColdPost')
+    Tag = apps.get_model('posts', 'Tag')
+    ColdPostTag = apps.get_model('posts', 'ColdPostTag')
+    tag_ids = dict(Tag.objects.values_list('name', 'pk'))
+    links = []
+    posts = ColdPost.objects.filter(text__contains='#').values_list(
+        'pk', 'text', 'pub_date'
+    )
+    for post_id, text, pub_date in posts.iterator():
+        names = {
+            name.lower() for name in HASHTAG.findall(text) if len(name) <= 50
+        }
+        for name in names:
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.create(name=name).pk
+            links.append(ColdPostTag(
+                tag_id=tag_ids[name], post_id=post_id, pub_date=pub_date
+            ))
+    ColdPostTag.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_hashtags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdPostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Время публикации поста')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='posts.ColdPost', verbose_name='Пост')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cold_post_links', to='posts.Tag', verbose_name='Хештег')),
+            ],
+            options={
+                'verbose_name': 'Хештег архивного поста',
+                'verbose_name_plural': 'Хештеги архивных постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='coldposttag',
+            index=models.Index(fields=['tag', 'pub_date', 'post'], name='coldposttag_tag_pub_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='coldposttag',
+            unique_together={('tag', 'post')},
+        ),
+        migrations.RunPython(fill_cold_tags, migrations.RunPython.noop),
+    ]
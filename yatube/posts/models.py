@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 
 User = get_user_model()
@@ -10,6 +11,9 @@ class Group(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     slug = models.SlugField('URL', unique=True, )
     description = models.TextField('Описание')
+    is_deleted = models.BooleanField(
+        'Удаляется', default=False, editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -19,6 +23,12 @@ class Group(models.Model):
         return self.title[:settings.CHAR_LENGTH]
 
 
+class PostQuerySet(models.QuerySet):
+    def visible(self):
+        """Без постов удаляемых пользователей: их дочищает фоновая задача."""
+        return self.filter(author__is_active=True)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -46,17 +56,41 @@ class Post(models.Model):
         blank=True,
         help_text='Загрузите картинку'
     )
+    likes_count = models.PositiveIntegerField(
+        'Лайки (свернутые счетчики)', default=0, editable=False
+    )
+    views_count = models.PositiveIntegerField(
+        'Просмотры', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date',), name='post_pub_date_idx'),
+            models.Index(
+                fields=('group', 'pub_date'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='post_author_pub_date_idx',
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:settings.POST_CHAR_LENGTH]
 
+    is_archived = False
+
 
 class Comment(models.Model):
+    PATH_STEP = 10
+    MAX_DEPTH = 24
+
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -78,15 +112,64 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name="Время публикации"
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на комментарий',
+    )
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=(MAX_DEPTH + 1) * (PATH_STEP + 1),
+        default='',
+        editable=False,
+    )
+    depth = models.PositiveSmallIntegerField(
+        'Глубина', default=0, editable=False
+    )
+    replies_count = models.PositiveIntegerField(
+        'Количество ответов', default=0, editable=False
+    )
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'path'), name='comment_post_path_idx'
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return self.text[:settings.POST_CHAR_LENGTH]
 
+    def save(self, *args, **kwargs):
+        """Путь строится из id, поэтому известен только после INSERT."""
+        if self.path:
+            return super().save(*args, **kwargs)
+        if self.parent is not None and self.parent.depth >= self.MAX_DEPTH:
+            self.parent = self.parent.parent
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            prefix = ''
+            if self.parent is not None:
+                prefix = self.parent.path
+                self.depth = self.parent.depth + 1
+                Comment.objects.filter(pk=self.parent_id).update(
+                    replies_count=F('replies_count') + 1
+                )
+            self.path = f'{prefix}{self.pk:0{self.PATH_STEP}d}/'
+            Comment.objects.filter(pk=self.pk).update(
+                path=self.path, depth=self.depth
+            )
+
+    def subtree_bounds(self):
+        """Границы диапазона path: вся ветка под комментарием."""
+        return self.path, self.path[:-1] + chr(ord('/') + 1)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -108,3 +191,312 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class ColdPost(models.Model):
+    """Пост, перенесенный в архив: id сохраняется, таблица только читается."""
+
+    id = models.PositiveIntegerField(primary_key=True)
+    text = models.TextField('Текст')
+    pub_date = models.DateTimeField('Время публикации')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cold_posts',
+        verbose_name='Автор',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='cold_posts',
+        blank=True,
+        null=True,
+        verbose_name='Группа',
+    )
+    image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+    likes_count = models.PositiveIntegerField('Лайки', default=0)
+    views_count = models.PositiveIntegerField('Просмотры', default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date',), name='coldpost_pub_date_idx'),
+            models.Index(
+                fields=('group', 'pub_date'),
+                name='coldpost_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='coldpost_author_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self):
+        return self.text[:settings.POST_CHAR_LENGTH]
+
+    is_archived = True
+
+
+class ColdComment(models.Model):
+    id = models.PositiveIntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ColdPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cold_comments',
+        blank=True,
+        null=True,
+        verbose_name='Автор комментария',
+    )
+    text = models.TextField('Текст комментария')
+    created = models.DateTimeField('Время публикации')
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на комментарий',
+    )
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=(Comment.MAX_DEPTH + 1) * (Comment.PATH_STEP + 1),
+    )
+    depth = models.PositiveSmallIntegerField('Глубина', default=0)
+    replies_count = models.PositiveIntegerField(
+        'Количество ответов', default=0
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'path'), name='coldcomment_post_path_idx'
+            ),
+        )
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+    def __str__(self):
+        return self.text[:settings.POST_CHAR_LENGTH]
+
+    subtree_bounds = Comment.subtree_bounds
+
+
+class FeedState(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_state',
+        verbose_name='Пользователь',
+    )
+    last_seen_post_id = models.PositiveIntegerField(
+        'Последний просмотренный пост', default=0
+    )
+    unseen_count = models.PositiveIntegerField('Новых постов', default=0)
+
+    class Meta:
+        verbose_name = 'Состояние ленты подписок'
+        verbose_name_plural = 'Состояния лент подписок'
+
+    def __str__(self):
+        return f'{self.user}: новых постов {self.unseen_count}'
+
+
+class MonthlyPostCount(models.Model):
+    SITE = 's'
+    GROUP = 'g'
+    AUTHOR = 'a'
+    SCOPES = (
+        (SITE, 'Весь сайт'),
+        (GROUP, 'Группа'),
+        (AUTHOR, 'Автор'),
+    )
+    scope = models.CharField('Область', max_length=1, choices=SCOPES)
+    object_id = models.PositiveIntegerField('ID группы или автора', default=0)
+    year = models.PositiveSmallIntegerField('Год')
+    month = models.PositiveSmallIntegerField('Месяц')
+    count = models.PositiveIntegerField('Количество постов', default=0)
+
+    class Meta:
+        ordering = ('-year', '-month')
+        unique_together = ('scope', 'object_id', 'year', 'month')
+        verbose_name = 'Количество постов за месяц'
+        verbose_name_plural = 'Количество постов по месяцам'
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02d}: {self.count}'
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пост',
+    )
+    created = models.DateTimeField('Время', auto_now_add=True)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_like'
+            ),
+        )
+        verbose_name = 'Лайк'
+        verbose_name_plural = 'Лайки'
+
+    def __str__(self):
+        return f'{self.user} лайкнул {self.post}'
+
+
+class LikeCounter(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+        verbose_name='Пост',
+    )
+    shard = models.PositiveSmallIntegerField('Шард')
+    count = models.IntegerField('Изменение числа лайков', default=0)
+
+    class Meta:
+        unique_together = ('post', 'shard')
+        verbose_name = 'Шард счетчика лайков'
+        verbose_name_plural = 'Шарды счетчиков лайков'
+
+    def __str__(self):
+        return f'{self.post_id}/{self.shard}: {self.count}'
+
+
+class DeletionJob(models.Model):
+    USER = 'u'
+    GROUP = 'g'
+    KIND_CHOICES = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    )
+
+    kind = models.CharField(
+        'Что удаляется', max_length=1, choices=KIND_CHOICES
+    )
+    object_id = models.PositiveIntegerField('ID объекта')
+    created = models.DateTimeField('Поставлено в очередь', auto_now_add=True)
+
+    class Meta:
+        ordering = ('created',)
+        unique_together = ('kind', 'object_id')
+        verbose_name = 'Задача удаления'
+        verbose_name_plural = 'Задачи удаления'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}'
+
+
+class Tag(models.Model):
+    name = models.CharField('Хештег', max_length=50, unique=True)
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Хештег'
+        verbose_name_plural = 'Хештеги'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    """Обратный индекс: посты хештега по (tag, pub_date, post)."""
+
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_links',
+        verbose_name='Хештег',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_links',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Время публикации поста')
+
+    class Meta:
+        unique_together = ('tag', 'post')
+        indexes = (
+            models.Index(
+                fields=('tag', 'pub_date', 'post'),
+                name='posttag_tag_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Хештег поста'
+        verbose_name_plural = 'Хештеги постов'
+
+    def __str__(self):
+        return f'{self.tag} в посте {self.post_id}'
+
+
+class ColdPostTag(models.Model):
+    """Строки индекса хештегов для постов из архива."""
+
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='cold_post_links',
+        verbose_name='Хештег',
+    )
+    post = models.ForeignKey(
+        ColdPost,
+        on_delete=models.CASCADE,
+        related_name='tag_links',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Время публикации поста')
+
+    class Meta:
+        unique_together = ('tag', 'post')
+        indexes = (
+            models.Index(
+                fields=('tag', 'pub_date', 'post'),
+                name='coldposttag_tag_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Хештег архивного поста'
+        verbose_name_plural = 'Хештеги архивных постов'
+
+    def __str__(self):
+        return f'{self.tag} в архивном посте {self.post_id}'
+
+
+class TagDailyCount(models.Model):
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='daily_counts',
+        verbose_name='Хештег',
+    )
+    day = models.DateField('День')
+    count = models.PositiveIntegerField('Количество постов', default=0)
+
+    class Meta:
+        unique_together = ('tag', 'day')
+        verbose_name = 'Количество постов с хештегом за день'
+        verbose_name_plural = 'Количество постов с хештегами по дням'
+
+    def __str__(self):
+        return f'{self.tag} {self.day}: {self.count}'
@@ -0,0 +1,218 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.db.models import F
+from django.dispatch import receiver
+
+from core.pagecache import purge_tags
+from .archive import change_month_counts, post_scopes
+from .coldstore import archiving_in_progress
+from .feeds import FEED_TAG
+from .feedstate import change_unseen, recount_unseen
+from .lookups import group_cache, post_cache, user_cache, username_cache
+from .models import (
+    ColdPost, Comment, Follow, Group, Like, MonthlyPostCount, Post, User
+)
+from .sitemaps import invalidate_shard
+from .tags import forget_tags
+from .utils import invalidate_following
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    invalidate_following(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        recount_unseen(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    recount_unseen(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    if created:
+        change_unseen(instance, 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_removed(sender, instance, **kwargs):
+    if archiving_in_progress():
+        return
+    change_unseen(instance, -1)
+
+
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=ColdPost)
+def post_tags_removed(sender, instance, **kwargs):
+    """До удаления: строки индекса уйдут каскадом вместе с постом."""
+    if archiving_in_progress():
+        return
+    forget_tags(instance)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        invalidate_following(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk,
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_pages_changed(sender, instance, **kwargs):
+    """Стоит до count_saved_post: тот перезаписывает _saved_group_id."""
+    purge_tags(
+        'posts',
+        f'post:{instance.pk}',
+        f'author:{instance.author_id}',
+        f'group:{instance.group_id}',
+        f'group:{getattr(instance, "_saved_group_id", None)}',
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_feeds_changed(sender, instance, **kwargs):
+    """Правка или удаление любого поста меняет ETag его лент."""
+    purge_tags(
+        FEED_TAG.format('posts'),
+        FEED_TAG.format(f'author:{instance.author_id}'),
+        FEED_TAG.format(f'group:{instance.group_id}'),
+        FEED_TAG.format(
+            f'group:{getattr(instance, "_saved_group_id", None)}'
+        ),
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        change_month_counts(
+            instance.pub_date,
+            post_scopes(instance.author_id, instance.group_id),
+            1,
+        )
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if saved_group_id == instance.group_id:
+        return
+    if saved_group_id is not None:
+        change_month_counts(
+            instance.pub_date, [(MonthlyPostCount.GROUP, saved_group_id)], -1
+        )
+    if instance.group_id is not None:
+        change_month_counts(
+            instance.pub_date, [(MonthlyPostCount.GROUP, instance.group_id)], 1
+        )
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    if archiving_in_progress():
+        return
+    change_month_counts(
+        instance.pub_date,
+        post_scopes(instance.author_id, instance.group_id),
+        -1,
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_sitemap_changed(sender, instance, **kwargs):
+    if archiving_in_progress():
+        return
+    invalidate_shard('posts', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def profile_sitemap_changed(sender, instance, **kwargs):
+    if kwargs.get('update_fields') == frozenset(('last_login',)):
+        return
+    invalidate_shard('profiles', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_sitemap_changed(sender, instance, **kwargs):
+    invalidate_shard('groups', instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def reply_deleted(sender, instance, **kwargs):
+    if archiving_in_progress():
+        return
+    if instance.parent_id is not None:
+        Comment.objects.filter(
+            pk=instance.parent_id, replies_count__gt=0,
+        ).update(replies_count=F('replies_count') - 1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_cache_changed(sender, instance, **kwargs):
+    post_cache.invalidate(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_cache_changed(sender, instance, **kwargs):
+    group_cache.invalidate(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_cache_changed(sender, instance, **kwargs):
+    if kwargs.get('update_fields') == frozenset(('last_login',)):
+        return
+    user_cache.invalidate(instance)
+    username_cache.invalidate(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def post_page_changed(sender, instance, **kwargs):
+    """Списки постов помечены тегами своих постов: лайк и комментарий
+    сбрасывают только страницы, где этот пост есть."""
+    purge_tags(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages_changed(sender, instance, **kwargs):
+    purge_tags(f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, instance, **kwargs):
+    purge_tags('posts', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_pages_changed(sender, instance, **kwargs):
+    """Новый пользователь еще не появился ни на одной странице."""
+    if kwargs.get('created') or kwargs.get('update_fields') == frozenset(
+        ('last_login',)
+    ):
+        return
+    purge_tags('posts', f'author:{instance.pk}')
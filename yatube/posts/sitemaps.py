@@ -0,0 +1,168 @@
+import os
+import tempfile
+from glob import glob
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse
+)
+from django.urls import reverse
+
+from .models import ColdPost, Group, Post, User
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class PostSitemap:
+    model = Post
+
+    def rows(self, start, end):
+        return Post.objects.filter(
+            pk__gte=start, pk__lt=end,
+        ).order_by('pk').values_list('pk', 'pub_date')
+
+    def location(self, row):
+        return reverse('posts:post_detail', args=(row[0],))
+
+    def lastmod(self, row):
+        return row[1].date().isoformat()
+
+
+class ColdPostSitemap(PostSitemap):
+    model = ColdPost
+
+    def rows(self, start, end):
+        return ColdPost.objects.filter(
+            pk__gte=start, pk__lt=end,
+        ).order_by('pk').values_list('pk', 'pub_date')
+
+
+class ProfileSitemap(PostSitemap):
+    model = User
+
+    def rows(self, start, end):
+        return User.objects.filter(
+            pk__gte=start, pk__lt=end, is_active=True,
+        ).order_by('pk').values_list('pk', 'username')
+
+    def location(self, row):
+        return reverse('posts:profile', args=(row[1],))
+
+    def lastmod(self, row):
+        return None
+
+
+class GroupSitemap(ProfileSitemap):
+    model = Group
+
+    def rows(self, start, end):
+        return Group.objects.filter(
+            pk__gte=start, pk__lt=end, is_deleted=False,
+        ).order_by('pk').values_list('pk', 'slug')
+
+    def location(self, row):
+        return reverse('posts:group_list', args=(row[1],))
+
+
+SITEMAPS = {
+    'posts': PostSitemap(),
+    'archive': ColdPostSitemap(),
+    'profiles': ProfileSitemap(),
+    'groups': GroupSitemap(),
+}
+
+
+def shard_of(pk):
+    return (pk - 1) // settings.SITEMAP_SHARD_SIZE
+
+
+def shard_path(host, section, shard):
+    return os.path.join(
+        settings.SITEMAP_ROOT, host, f'{section}-{shard}.xml'
+    )
+
+
+def invalidate_shard(section, pk):
+    """Удаляет файлы шарда с объектом pk, шард пересоберется при запросе."""
+    pattern = shard_path('*', section, shard_of(pk))
+    for path in glob(pattern):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def render_shard(sitemap, shard, base_url):
+    """Потоково строит шард: итератор запроса вместо списка в памяти."""
+    start = shard * settings.SITEMAP_SHARD_SIZE + 1
+    rows = sitemap.rows(start, start + settings.SITEMAP_SHARD_SIZE)
+    yield f'{XML_HEADER}<urlset xmlns="{XMLNS}">\n'
+    for row in rows.iterator(chunk_size=settings.SITEMAP_CHUNK_SIZE):
+        lastmod = sitemap.lastmod(row)
+        yield (
+            f'<url><loc>{escape(base_url + sitemap.location(row))}</loc>'
+            + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '')
+            + '</url>\n'
+        )
+    yield '</urlset>\n'
+
+
+def write_through(chunks, path):
+    """Отдает куски клиенту и сохраняет их в файл, если шард дописан."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
+            for chunk in chunks:
+                temp_file.write(chunk)
+                yield chunk
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def shard_count(sitemap):
+    max_pk = sitemap.model.objects.aggregate(max_pk=Max('pk'))['max_pk']
+    return shard_of(max_pk) + 1 if max_pk else 0
+
+
+def sitemap_index(request):
+    base_url = request.build_absolute_uri('/')[:-1]
+    entries = []
+    for section, sitemap in SITEMAPS.items():
+        for shard in range(shard_count(sitemap)):
+            location = reverse('posts:sitemap_shard', args=(section, shard))
+            entries.append(
+                f'<sitemap><loc>{escape(base_url + location)}</loc>'
+                '</sitemap>\n'
+            )
+    content = (
+        f'{XML_HEADER}<sitemapindex xmlns="{XMLNS}">\n'
+        + ''.join(entries)
+        + '</sitemapindex>\n'
+    )
+    return HttpResponse(content, content_type='application/xml')
+
+
+def sitemap_shard(request, section, shard):
+    sitemap = SITEMAPS.get(section)
+    if sitemap is None:
+        raise Http404('Нет такой карты сайта.')
+    path = shard_path(request.get_host().replace(':', '_'), section, shard)
+    if os.path.exists(path):
+        return FileResponse(
+            open(path, 'rb'), content_type='application/xml'
+        )
+    if shard >= shard_count(sitemap):
+        raise Http404('Нет такого шарда карты сайта.')
+    base_url = request.build_absolute_uri('/')[:-1]
+    return StreamingHttpResponse(
+        write_through(render_shard(sitemap, shard, base_url), path),
+        content_type='application/xml',
+    )
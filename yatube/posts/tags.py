@@ -0,0 +1,95 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.cache import stampede_cached
+from core.pagecache import purge_tags
+from .models import PostTag, Tag, TagDailyCount
+
+# #тег: буквы, цифры и _, хотя бы одна буква; не часть слова или
+# HTML-сущности вроде &#x27;.
+HASHTAG = re.compile(r'(?<![\w&#])#(\w*[^\W\d_]\w*)')
+
+TAG_MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def extract_tags(text):
+    """Имена хештегов текста в нижнем регистре, без повторов."""
+    return sorted({
+        name.lower() for name in HASHTAG.findall(text)
+        if len(name) <= TAG_MAX_LENGTH
+    })
+
+
+def change_day_counts(tag_ids, pub_date, delta):
+    day = timezone.localdate(pub_date)
+    counts = TagDailyCount.objects.filter(tag_id__in=tag_ids, day=day)
+    if delta < 0:
+        counts.filter(count__gte=-delta).update(count=F('count') + delta)
+        return
+    updated = set(counts.values_list('tag_id', flat=True))
+    counts.update(count=F('count') + delta)
+    for tag_id in set(tag_ids) - updated:
+        _, created = TagDailyCount.objects.get_or_create(
+            tag_id=tag_id, day=day, defaults={'count': delta}
+        )
+        if not created:
+            TagDailyCount.objects.filter(tag_id=tag_id, day=day).update(
+                count=F('count') + delta
+            )
+
+
+def sync_tags(post, names):
+    """Приводит индекс хештегов поста к names и правит дневные счетчики.
+
+    Вызывается после сохранения поста из формы: текст разбирается один
+    раз при записи, а не при каждом чтении ленты.
+    """
+    with transaction.atomic():
+        current = dict(PostTag.objects.filter(post=post).values_list(
+            'tag__name', 'tag_id'
+        ))
+        removed = [
+            tag_id for name, tag_id in current.items() if name not in names
+        ]
+        added = [name for name in names if name not in current]
+        if removed:
+            PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+            change_day_counts(removed, post.pub_date, -1)
+        if added:
+            Tag.objects.bulk_create(
+                [Tag(name=name) for name in added], ignore_conflicts=True
+            )
+            tag_ids = list(Tag.objects.filter(
+                name__in=added
+            ).values_list('pk', flat=True))
+            PostTag.objects.bulk_create(
+                PostTag(tag_id=tag_id, post=post, pub_date=post.pub_date)
+                for tag_id in tag_ids
+            )
+            change_day_counts(tag_ids, post.pub_date, 1)
+    if removed or added:
+        purge_tags('posts')
+
+
+def forget_tags(post):
+    """Снимает пост, горячий или архивный, со счетчиков перед удалением;
+    строки индекса удалит каскад."""
+    tag_ids = list(post.tag_links.values_list('tag_id', flat=True))
+    if tag_ids:
+        change_day_counts(tag_ids, post.pub_date, -1)
+
+
+@stampede_cached('trending_tags:{}', settings.TRENDING_CACHE_TIMEOUT)
+def trending_tags(limit):
+    """Хештеги с наибольшим числом постов за TRENDING_DAYS дней."""
+    since = timezone.localdate() - timedelta(days=settings.TRENDING_DAYS - 1)
+    return list(TagDailyCount.objects.filter(day__gte=since).values(
+        'tag__name'
+    ).annotate(total=Sum('count')).filter(total__gt=0).order_by(
+        '-total', 'tag__name'
+    ).values_list('tag__name', 'total')[:limit])
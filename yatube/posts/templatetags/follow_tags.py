@@ -0,0 +1,16 @@
+from django import template
+
+from ..utils import get_following
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def following_set(context):
+    """Подписки текущего пользователя для проверки целой страницы авторов:
+    {% following_set as following %}{% if post.author_id in following %}
+    """
+    request = context['request']
+    if not hasattr(request, '_following_set'):
+        request._following_set = get_following(request.user)
+    return request._following_set
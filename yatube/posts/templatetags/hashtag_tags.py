@@ -0,0 +1,40 @@
+from django import template
+from django.conf import settings
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..tags import HASHTAG, TAG_MAX_LENGTH, trending_tags
+
+register = template.Library()
+
+
+def tag_link(name):
+    if len(name) > TAG_MAX_LENGTH:
+        return f'#{name}'
+    return format_html(
+        '<a href="{}">#{}</a>',
+        reverse('posts:tag_posts', args=(name.lower(),)),
+        name,
+    )
+
+
+@register.filter(needs_autoescape=True)
+def hashtags(text, autoescape=True):
+    """Текст с #хештегами-ссылками.
+
+    Хештеги ищутся в исходном тексте, как в extract_tags, и экранируются
+    уже куски: иначе &#tag после экранирования стал бы ссылкой.
+    """
+    pieces = HASHTAG.split(text)
+    for index, piece in enumerate(pieces):
+        if index % 2:
+            pieces[index] = tag_link(piece)
+        elif autoescape:
+            pieces[index] = escape(piece)
+    return mark_safe(''.join(pieces))
+
+
+@register.inclusion_tag('posts/includes/trending.html')
+def trending(limit=None):
+    return {'tags': trending_tags(limit or settings.TRENDING_TAGS)}
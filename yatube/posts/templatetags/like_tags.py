@@ -0,0 +1,18 @@
+from django import template
+
+from ..likes import attach_likes
+from ..models import ColdPost, Post
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def load_likes(context, posts):
+    """Лайки и отметки пользователя для страницы постов одним запросом.
+
+    Вызывается внутри {% stampede_cache %}: запрос идет только при промахе.
+    """
+    if isinstance(posts, (Post, ColdPost)):
+        posts = [posts]
+    attach_likes(posts, context['request'].user)
+    return ''
@@ -0,0 +1,262 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..likes import like, like_stats
+from ..models import (
+    Comment, DeletionJob, Follow, Group, MonthlyPostCount, Post, User
+)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_2',
+            description='Тестовое описание 2',
+        )
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def _create_posts(self, number):
+        start = User.objects.count()
+        for index in range(start, start + number):
+            author = User.objects.create_user(username=f'user_{index}')
+            post = Post.objects.create(
+                text=f'Пост {index}', author=author, group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text='Текст')
+
+    def _changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка в админке не зависит от числа строк"""
+        names = (
+            'admin:posts_post_changelist',
+            'admin:posts_comment_changelist',
+        )
+        self._create_posts(2)
+        self.admin_client.get(reverse('admin:index'))
+        few = [self._changelist_queries(name) for name in names]
+        self._create_posts(10)
+        many = [self._changelist_queries(name) for name in names]
+        self.assertEqual(few, many)
+
+    def test_reassign_group_action(self):
+        """Перенос постов в группу действием обновляет счетчики месяцев"""
+        self._create_posts(3)
+        now = timezone.localtime()
+        self.admin_client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'reassign_group',
+                'group': self.group_2.pk,
+                '_selected_action': Post.objects.values_list(
+                    'pk', flat=True
+                ),
+            },
+        )
+        self.assertEqual(self.group_2.posts.count(), 3)
+        buckets = MonthlyPostCount.objects.filter(
+            scope=MonthlyPostCount.GROUP, year=now.year, month=now.month
+        )
+        self.assertEqual(buckets.get(object_id=self.group.pk).count, 0)
+        self.assertEqual(buckets.get(object_id=self.group_2.pk).count, 3)
+
+    def test_reassign_group_action_changes_feeds(self):
+        """После переноса меняются ETag лент обеих групп и общей"""
+        self._create_posts(1)
+        post = Post.objects.get()
+        urls = (
+            reverse('posts:index_rss'),
+            reverse('posts:group_rss', args=(self.group.slug,)),
+            reverse('posts:group_rss', args=(self.group_2.slug,)),
+        )
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.admin_client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'reassign_group',
+                'group': self.group_2.pk,
+                '_selected_action': [post.pk],
+            },
+        )
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertIn(post.text, response.content.decode())
+
+    def test_reassign_group_action_validates_group(self):
+        """Перенос в несуществующую группу или по неверному id отклоняется"""
+        self._create_posts(2)
+        missing = Group.objects.order_by('-pk').first().pk + 1
+        for group_id in (missing, 'abc'):
+            with self.subTest(group=group_id):
+                response = self.admin_client.post(
+                    reverse('admin:posts_post_changelist'),
+                    {
+                        'action': 'reassign_group',
+                        'group': group_id,
+                        '_selected_action': Post.objects.values_list(
+                            'pk', flat=True
+                        ),
+                    },
+                    follow=True,
+                )
+                self.assertEqual(self.group.posts.count(), 2)
+                self.assertEqual(len(response.context['messages']), 1)
+
+    def test_delete_in_chunks_action(self):
+        """Удаление выбранных постов порциями"""
+        self._create_posts(3)
+        self.admin_client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'delete_in_chunks',
+                '_selected_action': Post.objects.values_list(
+                    'pk', flat=True
+                ),
+            },
+        )
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DeletionTests(TransactionTestCase):
+    """Картинки стираются после коммита порции, поэтому без TestCase."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin'
+        )
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        self.author = User.objects.create_user(username='author')
+        self.reader_post = Post.objects.create(
+            text='Пост читателя', author=self.reader, group=self.group
+        )
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=self.author,
+                group=self.group,
+                image=SimpleUploadedFile(
+                    name=f'small_{number}.gif',
+                    content=(
+                        b'GIF89a\x01\x00\x01\x00\x00\x00\x00!'
+                        b'\xf9\x04\x00\x00\x00\x00\x00,\x00\x00'
+                        b'\x00\x00\x01\x00\x01\x00\x00\x02\x00;'
+                    ),
+                    content_type='image/gif',
+                ),
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=self.reader_post, author=self.author, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        like(self.author, self.reader_post)
+
+    def _delete(self, name, obj):
+        self.admin_client.post(
+            reverse(f'admin:{name}_delete', args=(obj.pk,)), {'post': 'yes'}
+        )
+
+    def test_user_hidden_then_removed_in_batches(self):
+        """Пользователь прячется сразу, а его строки удаляются порциями"""
+        images = [
+            os.path.join(TEMP_MEDIA_ROOT, post.image.name)
+            for post in self.posts
+        ]
+        self._delete('auth_user', self.author)
+        self.assertTrue(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(
+            User.objects.get(pk=self.author.pk).is_active
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), [
+            self.reader_post
+        ])
+        call_command(
+            'process_deletions', batch_size=2, stdout=open(os.devnull, 'w')
+        )
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(DeletionJob.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(self.reader_post.comments.exists())
+        self.assertEqual(
+            like_stats([self.reader_post.pk], self.reader)[
+                self.reader_post.pk
+            ],
+            (0, False),
+        )
+        for path in images:
+            self.assertFalse(os.path.exists(path))
+
+    def test_group_hidden_then_removed_in_batches(self):
+        """Группа прячется сразу, посты отвязываются порциями"""
+        self._delete('posts_group', self.group)
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        )
+        self.assertEqual(response.status_code, 404)
+        feed = reverse('posts:index_rss')
+        etag = self.client.get(feed)['ETag']
+        call_command(
+            'process_deletions', batch_size=2, stdout=open(os.devnull, 'w')
+        )
+        self.assertNotEqual(self.client.get(feed)['ETag'], etag)
+        self.assertFalse(Group.objects.filter(pk=self.group.pk).exists())
+        self.assertFalse(Post.objects.filter(group__isnull=False).exists())
+        self.assertEqual(Post.objects.count(), len(self.posts) + 1)
+        self.assertFalse(MonthlyPostCount.objects.filter(
+            scope=MonthlyPostCount.GROUP, object_id=self.group.pk,
+        ).exists())
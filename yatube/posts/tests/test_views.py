@@ -1,12 +1,46 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import (
+    Client, LiveServerTestCase, RequestFactory, TestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from core.nplusone import detect_n_plus_one
+from .. import viewcounter
+from ..coldstore import archive_posts
+from ..feedstate import unseen_count
 from ..forms import PostForm
-from ..models import Follow, Group, Post, User
+from ..likes import like_stats
+from ..models import (
+    ColdComment, ColdPost, ColdPostTag, Comment, FeedState, Follow, Group,
+    Like, LikeCounter, MonthlyPostCount, Post, PostTag, TagDailyCount, User
+)
+from ..tags import sync_tags, trending_tags
+from ..threads import post_thread
+from ..utils import get_following
+
+TEMP_CACHE_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': TEMP_CACHE_ROOT,
+    }
+}
 
 
 class PostsPagesTests(TestCase):
@@ -219,6 +253,11 @@ class FollowerTests(TestCase):
             text='Тест подписок',
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
         self.authorized_follower = Client()
         self.authorized_follower.force_login(self.follower)
@@ -240,6 +279,24 @@ class FollowerTests(TestCase):
         self.assertEqual(follow.author, self.post.author)
         self.assertEqual(follow.user, self.follower)
 
+    def test_follow_index_loads_groups_without_n_plus_one(self):
+        """Лента подписок не грузит группы постов по одной"""
+        Follow.objects.create(user=self.follower, author=self.following)
+        for number in range(3):
+            Post.objects.create(
+                author=self.following,
+                text=f'Пост {number}',
+                group=Group.objects.create(
+                    title=f'Группа {number}', slug=f'group-{number}',
+                    description='Описание',
+                ),
+            )
+        with detect_n_plus_one(mode='raise'):
+            response = self.authorized_follower.get(
+                reverse('posts:follow_index')
+            )
+        self.assertContains(response, '#Группа 2')
+
     def test_unfollow(self):
         """Проверка работы отписки"""
         Follow.objects.create(
@@ -280,3 +337,958 @@ class FollowerTests(TestCase):
             follow
         count_2 = Follow.objects.count()
         self.assertEqual(count_2, count + 1)
+
+    def test_following_cache_invalidated(self):
+        """Кеш подписок сбрасывается при подписке и отписке"""
+        cache.clear()
+        self.assertNotIn(self.following, get_following(self.follower))
+        self.authorized_follower.get(
+            reverse('posts:profile_follow', args=(self.following,))
+        )
+        self.assertIn(self.following, get_following(self.follower))
+        self.authorized_follower.get(
+            reverse('posts:profile_unfollow', args=(self.following,))
+        )
+        self.assertNotIn(self.following, get_following(self.follower))
+
+    def test_following_read_from_db_on_local_cache(self):
+        """На локальном кеше воркера подписки читаются из БД"""
+        get_following(self.follower)
+        Follow.objects.bulk_create(
+            [Follow(user=self.follower, author=self.following)]
+        )
+        self.assertIn(self.following, get_following(self.follower))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_following_set_tag_without_queries(self):
+        """Проверка подписок для страницы авторов без запросов к БД"""
+        cache.clear()
+        Follow.objects.create(user=self.follower, author=self.following)
+        get_following(self.follower)
+        request = RequestFactory().get('/')
+        request.user = self.follower
+        template = Template(
+            '{% load follow_tags %}{% following_set as following %}'
+            '{% for author in authors %}'
+            '{% if author.pk in following %}+{% else %}-{% endif %}'
+            '{% endfor %}'
+        )
+        context = Context({
+            'request': request,
+            'authors': [self.following, self.follower, self.following],
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(context), '+-+')
+
+    def test_profile_lookup_cache_follows_rename(self):
+        """Профиль читается из кеша объектов и видит переименование"""
+        cache.clear()
+        address = reverse('posts:profile', args=(self.following.username,))
+        self.client.get(address)
+        self.following.username = 'renamed'
+        self.following.save()
+        self.assertEqual(self.client.get(address).status_code, 404)
+        response = self.client.get(reverse('posts:profile', args=('renamed',)))
+        self.assertEqual(response.context['author'], self.following)
+        self.following.username = 'following'
+        self.following.save()
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_unseen_posts_badge(self):
+        """Счетчик новых постов растет с постами авторов и сбрасывается"""
+        cache.clear()
+        self.authorized_follower.get(
+            reverse('posts:profile_follow', args=(self.following,))
+        )
+        self.assertEqual(unseen_count(self.follower), 1)
+        new_post = Post.objects.create(author=self.following, text='Новый')
+        Post.objects.create(author=self.follower, text='Свой пост')
+        with self.assertNumQueries(1):
+            self.assertEqual(unseen_count(self.follower), 2)
+            self.assertEqual(unseen_count(self.follower), 2)
+        response = self.authorized_follower.get(reverse('posts:index'))
+        self.assertContains(response, '<span class="badge bg-danger">2')
+        new_post.delete()
+        self.assertEqual(unseen_count(self.follower), 1)
+        self.authorized_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(unseen_count(self.follower), 0)
+        Post.objects.create(author=self.following, text='Еще новее')
+        self.assertEqual(unseen_count(self.follower), 1)
+
+    def test_unseen_read_from_db_on_local_cache(self):
+        """На локальном кеше воркера счетчик читается из БД"""
+        FeedState.objects.create(user=self.follower)
+        self.assertEqual(unseen_count(self.follower), 0)
+        FeedState.objects.filter(user=self.follower).update(unseen_count=5)
+        self.assertEqual(unseen_count(self.follower), 5)
+
+    def test_unseen_for_many_followers(self):
+        """Новый пост популярного автора не упирается в число подписчиков"""
+        User.objects.bulk_create(
+            User(username=f'reader_{number}') for number in range(1200)
+        )
+        readers = User.objects.filter(username__startswith='reader_')
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=self.following) for reader in readers
+        )
+        FeedState.objects.bulk_create(
+            FeedState(user=reader) for reader in readers
+        )
+        Post.objects.create(author=self.following, text='Для всех')
+        reader = readers.last()
+        self.assertEqual(unseen_count(reader), 1)
+        self.assertEqual(
+            FeedState.objects.filter(
+                user__username__startswith='reader_', unseen_count=1
+            ).count(),
+            1200,
+        )
+
+
+class ArchiveViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_2',
+            description='Тестовое описание 2',
+        )
+        for number in range(settings.NUMS_TEST_POSTS):
+            Post.objects.create(
+                text=f'Тестовый пост {number}',
+                author=cls.author,
+                group=cls.group,
+            )
+        cls.now = timezone.localtime()
+
+    def _count(self, scope, object_id=0):
+        return MonthlyPostCount.objects.get(
+            scope=scope,
+            object_id=object_id,
+            year=self.now.year,
+            month=self.now.month,
+        ).count
+
+    def test_month_counts_follow_posts(self):
+        """Счетчики месяцев обновляются при создании, смене группы, удалении"""
+        self.assertEqual(
+            self._count(MonthlyPostCount.SITE), settings.NUMS_TEST_POSTS
+        )
+        post = Post.objects.first()
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(
+            self._count(MonthlyPostCount.GROUP, self.group.pk),
+            settings.NUMS_TEST_POSTS - 1,
+        )
+        self.assertEqual(
+            self._count(MonthlyPostCount.GROUP, self.group_2.pk), 1
+        )
+        post.delete()
+        self.assertEqual(
+            self._count(MonthlyPostCount.GROUP, self.group_2.pk), 0
+        )
+        self.assertEqual(
+            self._count(MonthlyPostCount.AUTHOR, self.author.pk),
+            settings.NUMS_TEST_POSTS - 1,
+        )
+
+    def test_archive_cursor_pagination(self):
+        """Архив месяца листается курсором для сайта, группы и автора"""
+        urls = (
+            ('posts:archive', ()),
+            ('posts:group_archive', (self.group.slug,)),
+            ('posts:profile_archive', (self.author.username,)),
+        )
+        for name, args in urls:
+            with self.subTest(name=name):
+                url = reverse(
+                    name, args=args + (self.now.year, self.now.month)
+                )
+                response = self.client.get(url)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), settings.POSTS_NUMS)
+                self.assertEqual(
+                    response.context['months'][0].count,
+                    settings.NUMS_TEST_POSTS,
+                )
+                response = self.client.get(
+                    url, {'cursor': page_obj.next_cursor}
+                )
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    settings.NUMS_TEST_POSTS - settings.POSTS_NUMS,
+                )
+                self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_archive_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу"""
+        url = reverse('posts:archive', args=(self.now.year, self.now.month))
+        for cursor in ('abc', '1', f'{10 ** 30}_1'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(
+                    len(response.context['page_obj']), settings.POSTS_NUMS
+                )
+
+    def test_archive_wrong_month(self):
+        """Несуществующий месяц возвращает 404"""
+        response = self.client.get(reverse('posts:archive', args=(2022, 13)))
+        self.assertEqual(response.status_code, 404)
+
+
+class FeedsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост для ленты',
+            author=cls.author,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_available(self):
+        """RSS и Atom ленты сайта, группы и автора содержат пост"""
+        feeds = (
+            ('posts:index_rss', None),
+            ('posts:index_atom', None),
+            ('posts:group_rss', (self.group.slug,)),
+            ('posts:group_atom', (self.group.slug,)),
+            ('posts:profile_rss', (self.author.username,)),
+            ('posts:profile_atom', (self.author.username,)),
+        )
+        for name, args in feeds:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=args))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(self.post.text, response.content.decode())
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+
+    def test_feed_conditional_and_cached(self):
+        """Лента отдает 304 по ETag и кеш до появления нового поста"""
+        url = reverse('posts:index_rss')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(new_post.text, response.content.decode())
+
+    def test_deleted_author_feed_not_found(self):
+        """Лента удаляемого автора отдает 404 и из кеша"""
+        for name in ('posts:profile_rss', 'posts:profile_atom'):
+            with self.subTest(name=name):
+                url = reverse(name, args=(self.author.username,))
+                etag = self.client.get(url)['ETag']
+                self.author.is_active = False
+                self.author.save()
+                self.assertEqual(self.client.get(url).status_code, 404)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    404,
+                )
+                self.author.is_active = True
+                self.author.save()
+
+    def test_feed_changes_on_edit_and_delete(self):
+        """Правка и удаление старого поста меняют ETag и тело ленты"""
+        newer = Post.objects.create(text='Свежий пост', author=self.author)
+        for name, args in (
+            ('posts:index_rss', None),
+            ('posts:group_rss', (self.group.slug,)),
+            ('posts:profile_atom', (self.author.username,)),
+        ):
+            with self.subTest(name=name):
+                url = reverse(name, args=args)
+                etag = self.client.get(url)['ETag']
+                self.post.text = 'Исправленный пост'
+                self.post.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Исправленный пост', response.content.decode())
+                self.post.text = 'Тестовый пост для ленты'
+                self.post.save()
+        url = reverse('posts:index_rss')
+        etag = self.client.get(url)['ETag']
+        Post.objects.get(pk=self.post.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Тестовый пост для ленты', response.content.decode())
+        self.assertIn(newer.text, response.content.decode())
+
+
+TEMP_SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SITEMAP_ROOT=TEMP_SITEMAP_ROOT, SITEMAP_SHARD_SIZE=2)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+            for number in range(5)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+
+    def test_sitemap_index_lists_shards(self):
+        """Индекс карты сайта перечисляет шарды по диапазонам id"""
+        response = self.client.get(reverse('posts:sitemap_index'))
+        content = response.content.decode()
+        last_shard = (self.posts[-1].pk - 1) // 2
+        self.assertIn(
+            reverse('posts:sitemap_shard', args=('posts', last_shard)),
+            content,
+        )
+        self.assertIn(
+            reverse('posts:sitemap_shard', args=('groups', 0)), content
+        )
+
+    def test_shard_written_and_invalidated(self):
+        """Шард сохраняется на диск и пересобирается при изменении поста"""
+        post = self.posts[0]
+        shard = (post.pk - 1) // 2
+        url = reverse('posts:sitemap_shard', args=('posts', shard))
+        post_url = reverse('posts:post_detail', args=(post.pk,)).encode()
+        content = b''.join(self.client.get(url).streaming_content)
+        self.assertIn(post_url, content)
+        with self.assertNumQueries(0):
+            cached = b''.join(self.client.get(url).streaming_content)
+        self.assertEqual(cached, content)
+        path = os.path.join(
+            TEMP_SITEMAP_ROOT, 'testserver', f'posts-{shard}.xml'
+        )
+        self.assertTrue(os.path.exists(path))
+        post.delete()
+        self.assertFalse(os.path.exists(path))
+        content = b''.join(self.client.get(url).streaming_content)
+        self.assertNotIn(post_url, content)
+
+    def test_out_of_range_shard_not_found(self):
+        """Шард за последним id - 404, файл не пишется"""
+        shard = (self.posts[-1].pk - 1) // 2 + 1
+        for section in ('posts', 'archive'):
+            url = reverse('posts:sitemap_shard', args=(section, shard))
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(os.path.exists(os.path.join(
+            TEMP_SITEMAP_ROOT, 'testserver', f'posts-{shard}.xml'
+        )))
+
+
+class ThreadedCommentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+
+    def _reply(self, text, parent=None):
+        data = {'text': text}
+        if parent is not None:
+            data['parent'] = parent.pk
+        self.authorized_author.post(
+            reverse('posts:add_comment', args=(self.post.pk,)), data
+        )
+        return Comment.objects.get(text=text)
+
+    def test_replies_loaded_in_tree_order(self):
+        """Ответы хранят путь и выводятся в порядке дерева одним запросом"""
+        first = self._reply('Первый')
+        second = self._reply('Второй')
+        reply = self._reply('Ответ на первый', first)
+        nested = self._reply('Ответ на ответ', reply)
+        self.assertEqual(nested.depth, 2)
+        self.assertTrue(nested.path.startswith(reply.path))
+        first.refresh_from_db()
+        self.assertEqual(first.replies_count, 1)
+        with self.assertNumQueries(1):
+            thread = [comment.text for comment in post_thread(self.post)]
+        self.assertEqual(
+            thread, [first.text, reply.text, nested.text, second.text]
+        )
+
+    @override_settings(COMMENTS_MAX_DEPTH=1, COMMENTS_PER_PAGE=2)
+    def test_depth_limit_and_cursors(self):
+        """Глубокие ответы открываются отдельной веткой, страницы - курсором"""
+        root = self._reply('Корень')
+        reply = self._reply('Ответ', root)
+        hidden = self._reply('Скрытый ответ', reply)
+        last = self._reply('Последний')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        comments = response.context['comments']
+        self.assertEqual(list(comments), [root, reply])
+        self.assertTrue(comments[1].has_hidden_replies)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            {'comments_after': comments.next_cursor},
+        )
+        self.assertEqual(list(response.context['comments']), [last])
+        response = self.client.get(
+            reverse('posts:comment_thread', args=(self.post.pk, reply.pk))
+        )
+        self.assertEqual(list(response.context['comments']), [reply, hidden])
+
+
+class LikesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_reader = Client()
+        self.authorized_reader.force_login(self.reader)
+
+    def _like(self, client, post):
+        client.get(reverse('posts:post_like', args=(post.pk,)))
+
+    def test_like_once_and_unlike(self):
+        """Лайк ставится один раз и снимается"""
+        post = self.posts[0]
+        self._like(self.authorized_reader, post)
+        self._like(self.authorized_reader, post)
+        self.assertEqual(Like.objects.filter(post=post).count(), 1)
+        self.assertEqual(
+            like_stats([post.pk], self.reader)[post.pk], (1, True)
+        )
+        self.authorized_reader.get(
+            reverse('posts:post_unlike', args=(post.pk,))
+        )
+        self.assertEqual(
+            like_stats([post.pk], self.reader)[post.pk], (0, False)
+        )
+
+    def test_fold_like_counters_single_pass(self):
+        """Свертка проходит посты один раз порциями и завершается"""
+        for post in self.posts:
+            self._like(self.authorized_reader, post)
+        out = StringIO()
+        call_command('fold_like_counters', batch_size=1, stdout=out)
+        self.assertIn(
+            f'Свернуто счетчиков постов: {len(self.posts)}', out.getvalue()
+        )
+        self.assertFalse(LikeCounter.objects.exists())
+
+    def test_like_stats_for_page_in_one_query(self):
+        """Лайки и отметки для всей страницы считаются одним запросом"""
+        for user in (self.author, self.reader):
+            client = Client()
+            client.force_login(user)
+            self._like(client, self.posts[1])
+        self._like(self.authorized_reader, self.posts[2])
+        with self.assertNumQueries(1):
+            stats = like_stats([post.pk for post in self.posts], self.reader)
+        self.assertEqual(stats, {
+            self.posts[0].pk: (0, False),
+            self.posts[1].pk: (2, True),
+            self.posts[2].pk: (1, True),
+        })
+        response = self.authorized_reader.get(reverse('posts:index'))
+        post = response.context['page_obj'][1]
+        self.assertEqual((post.like_total, post.liked), (2, True))
+
+    def test_fold_like_counters(self):
+        """Свертка переносит шарды в Post.likes_count без потери лайков"""
+        post = self.posts[0]
+        self._like(self.authorized_reader, post)
+        call_command('fold_like_counters', stdout=open(os.devnull, 'w'))
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertFalse(LikeCounter.objects.filter(post=post).exists())
+        self.authorized_reader.get(
+            reverse('posts:post_unlike', args=(post.pk,))
+        )
+        self.assertEqual(
+            like_stats([post.pk], self.reader)[post.pk], (0, False)
+        )
+
+
+@override_settings(VIEW_FLUSH_INTERVAL=3600, VIEW_FLUSH_SIZE=100)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        viewcounter._pending.clear()
+        viewcounter.flush_views()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def _view(self, post):
+        return self.authorized_client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+
+    def _stored(self, post):
+        post.refresh_from_db()
+        return post.views_count
+
+    def test_views_buffered_until_flush(self):
+        """Просмотры копятся в памяти и сбрасываются одним запросом"""
+        for _ in range(3):
+            response = self._view(self.posts[0])
+        self._view(self.posts[1])
+        self.assertEqual(response.context['views_count'], 3)
+        self.assertEqual(self._stored(self.posts[0]), 0)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(viewcounter.flush_views(), 2)
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._stored(self.posts[0]), 3)
+        self.assertEqual(self._stored(self.posts[1]), 1)
+        response = self._view(self.posts[0])
+        self.assertEqual(response.context['views_count'], 4)
+
+    def test_flush_on_size_threshold(self):
+        """При переполнении буфера просмотры сбрасываются сразу"""
+        with self.settings(VIEW_FLUSH_SIZE=2):
+            self._view(self.posts[0])
+            self._view(self.posts[1])
+        self.assertEqual(self._stored(self.posts[0]), 1)
+        self.assertEqual(self._stored(self.posts[1]), 1)
+        self.assertEqual(viewcounter.pending_views(self.posts[0].pk), 0)
+
+    def test_failed_flush_keeps_views(self):
+        """Ошибка базы при сбросе не роняет страницу и не теряет просмотры"""
+        def locked(execute, sql, params, many, context):
+            if '"views_count"' in sql and sql.startswith('UPDATE'):
+                raise OperationalError('database is locked')
+            return execute(sql, params, many, context)
+
+        with self.settings(VIEW_FLUSH_SIZE=1):
+            with self.assertLogs('posts.viewcounter', 'WARNING'):
+                with connection.execute_wrapper(locked):
+                    response = self._view(self.posts[0])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(viewcounter.pending_views(self.posts[0].pk), 1)
+            self.assertEqual(self._stored(self.posts[0]), 0)
+            viewcounter.flush_views()
+        self.assertEqual(self._stored(self.posts[0]), 1)
+
+
+class ColdStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cold', description='Описание'
+        )
+        cls.old_posts = [
+            Post.objects.create(
+                text=f'Старый пост {number}', author=cls.author,
+                group=cls.group,
+            )
+            for number in range(3)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.old_posts[0], author=cls.author, text='Комментарий'
+        )
+        cls.reply = Comment.objects.create(
+            post=cls.old_posts[0], author=cls.author, text='Ответ',
+            parent=cls.comment,
+        )
+        cls.old_date = timezone.now() - timezone.timedelta(days=800)
+        Post.objects.filter(
+            pk__in=[post.pk for post in cls.old_posts]
+        ).update(pub_date=cls.old_date)
+        for number in range(settings.POSTS_NUMS + 2):
+            Post.objects.create(text=f'Новый пост {number}', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.authorized_client.get(
+            reverse('posts:post_like', args=(self.old_posts[0].pk,))
+        )
+        self.month_counts = list(MonthlyPostCount.objects.values_list(
+            'scope', 'object_id', 'year', 'month', 'count'
+        ))
+        archive_posts(
+            timezone.now() - timezone.timedelta(days=365), batch_size=2
+        )
+
+    def test_posts_moved_with_comments(self):
+        """Старые посты с комментариями и лайками переезжают в архив"""
+        old_ids = [post.pk for post in self.old_posts]
+        self.assertFalse(Post.objects.filter(pk__in=old_ids).exists())
+        self.assertEqual(
+            ColdPost.objects.filter(pk__in=old_ids).count(), len(old_ids)
+        )
+        self.assertEqual(ColdPost.objects.get(pk=old_ids[0]).likes_count, 1)
+        reply = ColdComment.objects.get(pk=self.reply.pk)
+        self.assertEqual(reply.parent_id, self.comment.pk)
+        self.assertEqual(reply.path, self.reply.path)
+        self.assertEqual(
+            ColdComment.objects.get(pk=self.comment.pk).replies_count, 1
+        )
+        self.assertEqual(list(MonthlyPostCount.objects.values_list(
+            'scope', 'object_id', 'year', 'month', 'count'
+        )), self.month_counts)
+
+    def test_post_detail_reads_archive(self):
+        """Архивный пост открывается по прежнему адресу"""
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(self.old_posts[0].pk,))
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['post'].is_archived)
+        self.assertIsNone(response.context['form'])
+        self.assertEqual(
+            [comment.pk for comment in response.context['comments']],
+            [self.comment.pk, self.reply.pk],
+        )
+        response = self.authorized_client.get(reverse(
+            'posts:comment_thread',
+            args=(self.old_posts[0].pk, self.comment.pk),
+        ))
+        self.assertEqual(
+            [comment.pk for comment in response.context['comments']],
+            [self.comment.pk, self.reply.pk],
+        )
+
+    def test_archived_post_not_editable(self):
+        """Правка архивного или несуществующего поста - 404"""
+        missing = Post.objects.order_by('-pk').first().pk + 1
+        for post_id in (self.old_posts[0].pk, missing):
+            with self.subTest(post_id=post_id):
+                response = self.authorized_client.get(
+                    reverse('posts:post_edit', args=(post_id,))
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_feeds_continue_into_archive(self):
+        """Дальние страницы лент дочитывают архив"""
+        old_ids = {post.pk for post in self.old_posts}
+        pages = (
+            reverse('posts:index') + '?page=2',
+            reverse('posts:profile', args=(self.author.username,))
+            + '?page=2',
+        )
+        for address in pages:
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                page_obj = response.context['page_obj']
+                self.assertEqual(
+                    page_obj.paginator.count,
+                    settings.POSTS_NUMS + 2 + len(old_ids),
+                )
+                self.assertEqual(
+                    {post.pk for post in page_obj if post.is_archived},
+                    old_ids,
+                )
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        )
+        self.assertEqual(
+            {post.pk for post in response.context['page_obj']}, old_ids
+        )
+        local = timezone.localtime(self.old_date)
+        response = self.client.get(
+            reverse('posts:archive', args=(local.year, local.month))
+        )
+        self.assertEqual(
+            {post.pk for post in response.context['page_obj']}, old_ids
+        )
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class WarmupTests(LiveServerTestCase):
+    """Прогрев ходит к запущенному серверу: здесь это поток этого же
+    процесса с тем же кешем."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='warm', description='Описание'
+        )
+        self.post = Post.objects.create(
+            text='Популярный пост', author=self.author, group=self.group
+        )
+
+    def test_warmup_fills_page_cache_without_counting_views(self):
+        """Прогрев кладет страницы в кеш и не накручивает просмотры"""
+        views = viewcounter.pending_views(self.post.pk)
+        out = StringIO()
+        call_command(
+            'warmup_cache', url=self.live_server_url, host='localhost',
+            concurrency=2, stdout=out, stderr=StringIO(),
+        )
+        self.assertIn('Прогрето страниц: 4', out.getvalue())
+        # add у файлового кеша не атомарен: параллельный прогрев мог
+        # затереть версию тега, повторный проход дозаполняет промахи.
+        call_command(
+            'warmup_cache', url=self.live_server_url, host='localhost',
+            concurrency=2, stdout=StringIO(), stderr=StringIO(),
+        )
+        self.assertEqual(viewcounter.pending_views(self.post.pk), views)
+        for address in (
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ):
+            with self.subTest(address=address):
+                with self.assertNumQueries(0):
+                    self.client.get(address, HTTP_HOST='localhost')
+        self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            HTTP_HOST='localhost', HTTP_X_WARMUP='forged',
+        )
+        self.assertEqual(viewcounter.pending_views(self.post.pk), views + 2)
+
+
+class DatasetTests(TestCase):
+    def generate(self):
+        before = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        post_base = before.first() or 0
+        user_base = User.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        call_command(
+            'generate_dataset', users=30, groups=3, posts=60, comments=90,
+            follows=4, workers=1, seed=7, batch_size=25, stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        return [
+            (author_id - user_base, text)
+            for author_id, text in Post.objects.filter(
+                pk__gt=post_base
+            ).order_by('pk').values_list('author_id', 'text')
+        ]
+
+    def test_dataset_is_deterministic_and_consistent(self):
+        """Набор повторяется по seed, счетчики месяцев сходятся"""
+        first = self.generate()
+        self.assertEqual(first, self.generate())
+        self.assertEqual(len(first), 60)
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 180)
+        site_total = MonthlyPostCount.objects.filter(
+            scope=MonthlyPostCount.SITE
+        ).aggregate(total=Sum('count'))['total']
+        self.assertEqual(site_total, 120)
+        authors = Counter(author for author, _ in first)
+        self.assertGreater(authors.most_common(1)[0][1], 60 / 30)
+        comment = Comment.objects.first()
+        self.assertEqual(comment.path, f'{comment.pk:010d}/')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(comment.post_id,))
+        )
+        self.assertContains(response, comment.text[:20])
+
+    def test_dataset_ids_skip_archive_and_purge_pages(self):
+        """id новых постов не пересекаются с архивом, страницы сброшены"""
+        author = User.objects.create_user(username='veteran')
+        Post.objects.create(text='Свежий', author=author)
+        old = Post.objects.create(text='Старый', author=author)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timezone.timedelta(days=800)
+        )
+        archive_posts(
+            timezone.now() - timezone.timedelta(days=365), batch_size=10
+        )
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        self.generate()
+        self.assertFalse(Post.objects.filter(pk=old.pk).exists())
+        self.assertTrue(ColdPost.objects.filter(pk=old.pk).exists())
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts:index'))
+        self.assertTrue(context.captured_queries)
+
+
+class HashtagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='tagger')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def tags_of(self, post):
+        return sorted(PostTag.objects.filter(post=post).values_list(
+            'tag__name', flat=True
+        ))
+
+    def day_counts(self):
+        return dict(TagDailyCount.objects.values_list('tag__name', 'count'))
+
+    def test_form_indexes_tags_on_create_and_edit(self):
+        """Хештеги индексируются при создании и правке поста"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': '#Django и #django, #python и C#, а не #2021'},
+        )
+        post = Post.objects.get(author=self.author)
+        self.assertEqual(self.tags_of(post), ['django', 'python'])
+        self.assertEqual(self.day_counts(), {'django': 1, 'python': 1})
+        self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': '#python и #tests'},
+        )
+        self.assertEqual(self.tags_of(post), ['python', 'tests'])
+        self.assertEqual(
+            self.day_counts(), {'django': 0, 'python': 1, 'tests': 1}
+        )
+        post.delete()
+        self.assertEqual(
+            self.day_counts(), {'django': 0, 'python': 0, 'tests': 0}
+        )
+
+    def test_tag_feed_paginates_by_cursor(self):
+        """Лента хештега листается курсором от новых постов к старым"""
+        posts = []
+        for number in range(settings.POSTS_NUMS + 2):
+            post = Post.objects.create(
+                text=f'Пост {number} #лента', author=self.author
+            )
+            sync_tags(post, ['лента'])
+            posts.append(post)
+        Post.objects.create(text='Без хештега', author=self.author)
+        address = reverse('posts:tag_posts', args=('Лента',))
+        response = self.client.get(address)
+        page = response.context['page_obj']
+        self.assertEqual(
+            [post.pk for post in page],
+            [post.pk for post in posts[::-1][:settings.POSTS_NUMS]],
+        )
+        response = self.client.get(address, {'cursor': page.next_cursor})
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [posts[1].pk, posts[0].pk],
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:tag_posts', args=('нет',))
+            ).status_code,
+            404,
+        )
+
+    def test_tags_render_as_links(self):
+        """Хештеги в тексте - ссылки, HTML-сущности не трогаются"""
+        post = Post.objects.create(
+            text="It's #Yatube <b>", author=self.author
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        link = reverse('posts:tag_posts', args=('yatube',))
+        self.assertContains(
+            response, f'It&#39;s <a href="{link}">#Yatube</a> &lt;b&gt;'
+        )
+
+    def test_archived_posts_stay_in_tag_feed(self):
+        """Архивный пост остается в ленте хештега и в счетчиках"""
+        old = Post.objects.create(text='Старый #архив', author=self.author)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timezone.timedelta(days=800)
+        )
+        old.refresh_from_db()
+        sync_tags(old, ['архив'])
+        new = Post.objects.create(text='Новый #архив', author=self.author)
+        sync_tags(new, ['архив'])
+        archive_posts(
+            timezone.now() - timezone.timedelta(days=365), batch_size=10
+        )
+        self.assertFalse(PostTag.objects.filter(post_id=old.pk).exists())
+        response = self.client.get(
+            reverse('posts:tag_posts', args=('архив',))
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new.pk, old.pk],
+        )
+        self.assertEqual(
+            TagDailyCount.objects.aggregate(total=Sum('count'))['total'], 2
+        )
+        ColdPost.objects.filter(pk=old.pk).delete()
+        self.assertFalse(ColdPostTag.objects.exists())
+        self.assertEqual(
+            TagDailyCount.objects.aggregate(total=Sum('count'))['total'], 1
+        )
+
+    def test_escaped_hash_is_not_a_tag(self):
+        """&#tag в тексте не становится ссылкой, как и в индексе"""
+        post = Post.objects.create(
+            text='&#tag и #tag', author=self.author
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        link = reverse('posts:tag_posts', args=('tag',))
+        self.assertContains(
+            response, f'&amp;#tag и <a href="{link}">#tag</a>'
+        )
+
+    def test_trending_tags_order(self):
+        """Тренды - по числу постов за последние дни"""
+        for text, names in (
+            ('#a #b', ['a', 'b']), ('#b', ['b']), ('#c', ['c']),
+        ):
+            post = Post.objects.create(text=text, author=self.author)
+            sync_tags(post, names)
+        self.assertEqual(trending_tags(2), [('b', 2), ('a', 1)])
@@ -0,0 +1,40 @@
+from django.conf import settings
+
+from .utils import CursorPage
+
+
+def comment_thread(comments, cursor=None, base_depth=0):
+    """Страница ветки в порядке дерева одним диапазонным запросом по path.
+
+    Ответы глубже COMMENTS_MAX_DEPTH не загружаются: у комментария на
+    последнем уровне выставляется has_hidden_replies для ссылки на ветку.
+    """
+    max_depth = base_depth + settings.COMMENTS_MAX_DEPTH
+    comments = comments.select_related('author').filter(
+        depth__lte=max_depth,
+    ).exclude(author__is_active=False)
+    if cursor:
+        comments = comments.filter(path__gt=cursor)
+    page = list(comments.order_by('path')[:settings.COMMENTS_PER_PAGE + 1])
+    next_cursor = None
+    if len(page) > settings.COMMENTS_PER_PAGE:
+        page = page[:settings.COMMENTS_PER_PAGE]
+        next_cursor = page[-1].path
+    for comment in page:
+        comment.indent = comment.depth - base_depth
+        comment.has_hidden_replies = bool(
+            comment.replies_count and comment.depth == max_depth
+        )
+    return CursorPage(page, next_cursor)
+
+
+def post_thread(post, cursor=None):
+    return comment_thread(post.comments.all(), cursor)
+
+
+def subtree_thread(comment, cursor=None):
+    start, end = comment.subtree_bounds()
+    comments = type(comment).objects.filter(
+        post_id=comment.post_id, path__gte=start, path__lt=end,
+    )
+    return comment_thread(comments, cursor, comment.depth)
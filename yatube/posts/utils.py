@@ -1,8 +1,147 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache import cache_is_shared
+from .models import Follow
+
+FOLLOWING_KEY = 'following:{}'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+MICROSECOND = timedelta(microseconds=1)
 
 
 def paginator(request, post_list):
     paginator = Paginator(post_list, settings.POSTS_NUMS)
     page_number = request.GET.get("page")
     return paginator.get_page(page_number)
+
+
+class CursorPage:
+    """Страница курсорной пагинации: без COUNT и OFFSET."""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(moment, pk):
+    return f'{(moment - EPOCH) // MICROSECOND}_{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = map(int, cursor.split('_'))
+        return EPOCH + micros * MICROSECOND, pk
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def cursor_paginator(request, post_list, date_field='pub_date', pk_field='pk',
+                     archive=None):
+    """Страница по ключу (date_field, pk_field) в порядке убывания.
+
+    archive — выборка из архивных таблиц: ее строки старше всех строк
+    post_list и дочитываются, только если post_list закончился.
+    """
+    position = decode_cursor(request.GET.get('cursor'))
+    after = Q()
+    if position is not None:
+        moment, pk = position
+        after = (
+            Q(**{f'{date_field}__lt': moment})
+            | Q(**{date_field: moment, f'{pk_field}__lt': pk})
+        )
+    objects = []
+    for query_list in (post_list, archive):
+        if query_list is None or len(objects) > settings.POSTS_NUMS:
+            break
+        objects += query_list.filter(after).order_by(
+            f'-{date_field}', f'-{pk_field}'
+        )[:settings.POSTS_NUMS + 1 - len(objects)]
+    if len(objects) <= settings.POSTS_NUMS:
+        return CursorPage(objects)
+    objects = objects[:settings.POSTS_NUMS]
+    last = objects[-1]
+    return CursorPage(
+        objects,
+        encode_cursor(getattr(last, date_field), getattr(last, pk_field)),
+    )
+
+
+class FollowingSet:
+    """Отсортированный массив id авторов с проверкой вхождения за O(log n)."""
+
+    def __init__(self, author_ids=()):
+        self.ids = array('L', author_ids)
+
+    def __contains__(self, author):
+        author_id = getattr(author, 'pk', author)
+        index = bisect_left(self.ids, author_id)
+        return index < len(self.ids) and self.ids[index] == author_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def following_ids(user_id):
+    return array('L', Follow.objects.filter(
+        user_id=user_id,
+    ).order_by('author_id').values_list('author_id', flat=True))
+
+
+def get_following(user):
+    """Подписки пользователя из кеша, при промахе - одним запросом.
+
+    На локальном кеше воркера - всегда из БД: invalidate_following
+    сбросил бы запись только в одном процессе.
+    """
+    if not user.is_authenticated:
+        return FollowingSet()
+    if not cache_is_shared():
+        return FollowingSet(following_ids(user.pk))
+    key = FOLLOWING_KEY.format(user.pk)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = following_ids(user.pk)
+        cache.set(key, author_ids, settings.FOLLOWING_CACHE_TIMEOUT)
+    return FollowingSet(author_ids)
+
+
+def pk_chunks(queryset, size):
+    """Списки pk по возрастанию порциями: каждую можно коммитить отдельно."""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
+
+
+def invalidate_following(user_id):
+    cache.delete(FOLLOWING_KEY.format(user_id))
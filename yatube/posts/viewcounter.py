@@ -0,0 +1,110 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .lookups import post_cache
+from .models import Post
+from .warmup import warming_in_progress
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+_flusher = None
+
+
+def count_view(post_id):
+    """Запоминает просмотр; в базу он попадет со следующим сбросом."""
+    if warming_in_progress():
+        return
+    with _lock:
+        _pending[post_id] += 1
+        due = (
+            len(_pending) >= settings.VIEW_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.VIEW_FLUSH_INTERVAL
+        )
+    if due:
+        try_flush_views()
+
+
+def pending_views(post_id):
+    """Просмотры поста, еще не сброшенные этим процессом."""
+    with _lock:
+        return _pending[post_id]
+
+
+def flush_views():
+    """Сбрасывает накопленные просмотры пачками UPDATE ... CASE.
+
+    Счетчик увеличивается на дельту, а не перезаписывается, поэтому
+    процессы могут сбрасывать свои буферы независимо друг от друга.
+    """
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    post_ids = sorted(pending)
+    size = settings.VIEW_FLUSH_SIZE
+    for start in range(0, len(post_ids), size):
+        chunk = post_ids[start:start + size]
+        try:
+            # Точка сохранения: сбой не портит транзакцию вызывающего.
+            with transaction.atomic():
+                Post.objects.filter(pk__in=chunk).update(
+                    views_count=F('views_count') + Case(
+                        *(
+                            When(pk=pk, then=Value(pending[pk]))
+                            for pk in chunk
+                        ),
+                        output_field=IntegerField(),
+                    )
+                )
+        except DatabaseError:
+            with _lock:
+                _pending.update({pk: pending[pk] for pk in post_ids[start:]})
+            raise
+        post_cache.invalidate_values(chunk)
+    return len(post_ids)
+
+
+def try_flush_views():
+    """Сброс без исключений: ошибка базы не должна ронять просмотр
+    страницы, несброшенное остается в буфере до следующей попытки."""
+    try:
+        return flush_views()
+    except DatabaseError:
+        logger.warning('Просмотры не сброшены', exc_info=True)
+        return 0
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.VIEW_FLUSH_INTERVAL)
+        try:
+            try_flush_views()
+        finally:
+            connection.close()
+
+
+def start_flusher():
+    """Запускает фоновый сброс по таймеру и сброс при выходе процесса.
+
+    Вызывается из PostsConfig.ready при VIEW_FLUSHER: при падении
+    процесса теряются просмотры не более чем за один интервал.
+    """
+    global _flusher
+    if _flusher is not None:
+        return
+    _flusher = threading.Thread(
+        target=_flush_forever, name='view-flusher', daemon=True
+    )
+    _flusher.start()
+    atexit.register(try_flush_views)
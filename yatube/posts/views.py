@@ -1,62 +1,128 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
+from django.utils.http import is_safe_url
 
+from core.pagecache import on_page_hit, tag_page
+from core.streaming import render_page
+from .archive import month_counts, month_range
+from .coldstore import TieredList, get_comment_or_404, get_post_or_404
+from .feedstate import mark_seen
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
+from .likes import like, unlike
+from .lookups import get_author_or_404, get_group_or_404
+from .models import (
+    ColdPost, ColdPostTag, Follow, MonthlyPostCount, Post, PostTag, Tag,
+)
+from .tags import extract_tags, sync_tags
+from .threads import post_thread, subtree_thread
+from .utils import CursorPage, cursor_paginator, get_following, paginator
+from .viewcounter import count_view, pending_views
+
+
+def tag_page_posts(request, page_obj):
+    """Лайк или комментарий сбрасывает только страницы со своим постом."""
+    tag_page(request, *(f'post:{post.pk}' for post in page_obj))
 
 
 def index(request):
-    post_list = Post.objects.select_related('group', 'author')
+    tag_page(request, 'posts')
+    post_list = TieredList(
+        Post.objects.visible().select_related('group', 'author'),
+        ColdPost.objects.visible().select_related('group', 'author'),
+    )
     page_obj = paginator(request, post_list)
-    return render(request, 'posts/index.html', {'page_obj': page_obj})
+    tag_page_posts(request, page_obj)
+    return render_page(request, 'posts/index.html', {'page_obj': page_obj})
 
 
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author')
+    group = get_group_or_404(slug)
+    tag_page(request, f'group:{group.pk}')
+    post_list = TieredList(
+        group.posts.visible().select_related('author'),
+        group.cold_posts.visible().select_related('author'),
+    )
     page_obj = paginator(request, post_list)
+    tag_page_posts(request, page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_page(request, 'posts/group_list.html', context)
+
+
+def tag_posts(request, name):
+    tag_page(request, 'posts')
+    tag = get_object_or_404(Tag, name=name.lower())
+    links = PostTag.objects.filter(
+        tag=tag, post__author__is_active=True
+    ).select_related('post__author', 'post__group')
+    cold_links = ColdPostTag.objects.filter(
+        tag=tag, post__author__is_active=True
+    ).select_related('post__author', 'post__group')
+    page = cursor_paginator(
+        request, links, pk_field='post_id', archive=cold_links
+    )
+    page_obj = CursorPage([link.post for link in page], page.next_cursor)
+    tag_page_posts(request, page_obj)
+    return render_page(
+        request, 'posts/tag_posts.html', {'tag': tag, 'page_obj': page_obj}
+    )
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = paginator(request, post_list)
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(
-            user=request.user,
-        )
+    author = get_author_or_404(username)
+    tag_page(request, f'author:{author.pk}')
+    post_list = TieredList(
+        author.posts.select_related('group'),
+        author.cold_posts.select_related('group'),
     )
+    page_obj = paginator(request, post_list)
+    tag_page_posts(request, page_obj)
+    following = author in get_following(request.user)
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following
     }
-    return render(request, 'posts/profile.html', context)
+    return render_page(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author').prefetch_related(
-            'comments__author'),
-        pk=post_id
-    )
-    form = CommentForm(
-        request.POST or None,
-        files=request.FILES or None
-    )
+    tag_page(request, f'post:{post_id}')
+    post = get_post_or_404(post_id)
+    tag_page(request, f'author:{post.author_id}', f'group:{post.group_id}')
+    form = None
+    views_count = post.views_count
+    if not post.is_archived:
+        form = CommentForm(
+            request.POST or None,
+            files=request.FILES or None
+        )
+        count_view(post.pk)
+        on_page_hit(request, 'posts.viewcounter.count_view', post.pk)
+        views_count += pending_views(post.pk)
+    reply_to = request.GET.get('reply_to', '')
     context = {
         'post': post,
+        'views_count': views_count,
         'form': form,
-        'comments': post.comments.all(),
+        'reply_to': reply_to if reply_to.isdigit() else '',
+        'comments': post_thread(post, request.GET.get('comments_after')),
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render_page(request, 'posts/post_detail.html', context)
+
+
+def comment_thread(request, post_id, comment_id):
+    comment = get_comment_or_404(post_id, comment_id)
+    context = {
+        'post': comment.post,
+        'comment': comment,
+        'comments': subtree_thread(
+            comment, request.GET.get('comments_after')
+        ),
+    }
+    return render(request, 'posts/comment_thread.html', context)
 
 
 @login_required
@@ -66,13 +132,14 @@ def post_create(request):
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        sync_tags(new_post, extract_tags(new_post.text))
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
 def post_edit(request, post_id):
-    post = Post.objects.get(pk=post_id)
+    post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
@@ -81,7 +148,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        sync_tags(post, extract_tags(post.text))
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -94,23 +162,33 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent = post.comments.filter(pk=parent_id).first()
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user
+    posts = TieredList(
+        Post.objects.visible().select_related('author', 'group').filter(
+            author__following__user=request.user
+        ),
+        ColdPost.objects.visible().select_related('author', 'group').filter(
+            author__following__user=request.user
+        ),
+        cache_cold_count=False,
     )
     page_obj = paginator(request, posts)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+    mark_seen(request.user)
+    return render_page(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
 @login_required
 def profile_follow(request, username):
     if username != request.user.username:
-        author = get_object_or_404(User, username=username)
+        author = get_author_or_404(username)
         Follow.objects.get_or_create(
             user=request.user,
             author=author,
@@ -126,3 +204,74 @@ def profile_unfollow(request, username):
         author__username=username)
     follower.delete()
     return redirect('posts:profile', username)
+
+
+def redirect_back(request, post_id):
+    referer = request.META.get('HTTP_REFERER')
+    if referer and is_safe_url(
+        referer,
+        allowed_hosts={request.get_host()},
+        require_https=request.is_secure(),
+    ):
+        return redirect(referer)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@login_required
+def post_like(request, post_id):
+    like(request.user, get_object_or_404(Post, pk=post_id))
+    return redirect_back(request, post_id)
+
+
+@login_required
+def post_unlike(request, post_id):
+    unlike(request.user, get_object_or_404(Post, pk=post_id))
+    return redirect_back(request, post_id)
+
+
+def render_archive(request, post_list, cold_list, year, month, scope,
+                   context):
+    start, end = month_range(year, month)
+    page_obj = cursor_paginator(
+        request,
+        post_list.filter(pub_date__gte=start, pub_date__lt=end),
+        archive=cold_list.filter(pub_date__gte=start, pub_date__lt=end),
+    )
+    object_id = getattr(context.get('group') or context.get('author'), 'pk', 0)
+    context.update({
+        'page_obj': page_obj,
+        'month_start': start,
+        'months': month_counts(scope, object_id),
+    })
+    return render(request, 'posts/archive.html', context)
+
+
+def archive(request, year, month):
+    return render_archive(
+        request,
+        Post.objects.visible().select_related('group', 'author'),
+        ColdPost.objects.visible().select_related('group', 'author'),
+        year, month, MonthlyPostCount.SITE, {}
+    )
+
+
+def group_archive(request, slug, year, month):
+    group = get_group_or_404(slug)
+    return render_archive(
+        request,
+        group.posts.visible().select_related('author'),
+        group.cold_posts.visible().select_related('author'),
+        year, month, MonthlyPostCount.GROUP,
+        {'group': group},
+    )
+
+
+def profile_archive(request, username, year, month):
+    author = get_author_or_404(username)
+    return render_archive(
+        request,
+        author.posts.select_related('group'),
+        author.cold_posts.select_related('group'),
+        year, month, MonthlyPostCount.AUTHOR,
+        {'author': author},
+    )
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from math import ceil
+
+from django.conf import settings
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.replay import HTTPTarget
+from .models import ColdPost, Group, Post, User
+
+# Заголовок запросов прогрева; значение - подпись от SECRET_KEY, чтобы
+# посторонний не мог отключить им счетчик просмотров.
+WARMUP_HEADER = 'X-Warmup'
+
+_state = threading.local()
+
+
+def warming_in_progress():
+    """Запрос пришел от прогрева: просмотры не считаем."""
+    return getattr(_state, 'warming', False)
+
+
+@contextmanager
+def warming():
+    _state.warming = True
+    try:
+        yield
+    finally:
+        _state.warming = False
+
+
+def warmup_token():
+    return salted_hmac('posts.warmup', 'warmup').hexdigest()
+
+
+class WarmupMiddleware:
+    """Помечает запросы прогрева; стоит до кеша страниц, потому что
+    и отдача из кеша считает просмотр."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(
+            'HTTP_' + WARMUP_HEADER.upper().replace('-', '_')
+        )
+        if token is None or not constant_time_compare(
+            token, warmup_token()
+        ):
+            return self.get_response(request)
+        with warming():
+            return self.get_response(request)
+
+
+def warmup_urls(pages, profiles, posts):
+    """Адреса для прогрева: первые страницы ленты, группы, топ авторов
+    и самые просматриваемые посты."""
+    total = Post.objects.visible().count()
+    total += ColdPost.objects.visible().count()
+    pages = min(pages, ceil(total / settings.POSTS_NUMS))
+    urls = [reverse('posts:index')]
+    urls += [f'{urls[0]}?page={number}' for number in range(2, pages + 1)]
+    urls += [
+        reverse('posts:group_list', args=(slug,))
+        for slug in Group.objects.filter(
+            is_deleted=False,
+        ).values_list('slug', flat=True)
+    ]
+    urls += [
+        reverse('posts:profile', args=(username,))
+        for username in User.objects.filter(is_active=True).annotate(
+            posts_total=Count('posts'),
+        ).order_by('-posts_total', 'pk').values_list(
+            'username', flat=True,
+        )[:profiles]
+    ]
+    urls += [
+        reverse('posts:post_detail', args=(pk,))
+        for pk in Post.objects.visible().order_by(
+            '-views_count', '-likes_count', '-pk',
+        ).values_list('pk', flat=True)[:posts]
+    ]
+    return urls
+
+
+def fetch(target, url, headers):
+    """Анонимный запрос к запущенному серверу: страницу рендерит
+    обслуживающий процесс и заполняет свои кеши страниц, фрагментов,
+    объектов и миниатюр. Ошибка соединения - статус 0."""
+    started = time.monotonic()
+    try:
+        status = target.send('GET', url, None, headers)
+    except OSError:
+        status = 0
+    return url, status, time.monotonic() - started
+
+
+def warm(urls, server_url, host=None, concurrency=1):
+    """Прогревает адреса на сервере server_url не более чем
+    в concurrency соединений.
+
+    host подставляется в заголовок Host: от него зависит ключ кеша
+    страниц. Возвращает (адрес, статус, секунды) в порядке адресов.
+    """
+    target = HTTPTarget(server_url)
+    headers = {WARMUP_HEADER: warmup_token()}
+    if host:
+        headers['Host'] = host
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        return list(executor.map(
+            lambda url: fetch(target, url, headers), urls
+        ))
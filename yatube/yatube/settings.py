@@ -29,12 +29,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StreamingGZipMiddleware',
+    'posts.warmup.WarmupMiddleware',
+    'core.pagecache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
+    'core.memtrack.MemoryTrackingMiddleware',
+    'core.profiling.ProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -53,6 +59,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.unseen.unseen_posts',
             ],
         },
     },
@@ -96,6 +103,16 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+STATIC_GZIP_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.json', '.xml')
+
+STATIC_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+STATIC_MAX_AGE = 60 * 5
+
 POSTS_NUMS = 10
 
 CHAR_LENGTH = 30
@@ -122,8 +139,127 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+FOLLOWING_CACHE_TIMEOUT = 60 * 60 * 24
+
+UNSEEN_CACHE_TIMEOUT = 60 * 60 * 24
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+FEED_ITEMS = 20
+
+FEED_CACHE_TIMEOUT = 60 * 60
+
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+
+SITEMAP_SHARD_SIZE = 50000
+
+SITEMAP_CHUNK_SIZE = 2000
+
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+ADMIN_BULK_CHUNK_SIZE = 500
+
+COMMENTS_PER_PAGE = 50
+
+COMMENTS_MAX_DEPTH = 5
+
+LIKE_COUNTER_SHARDS = 8
+
+LIKE_FOLD_BATCH_SIZE = 1000
+
+VIEW_FLUSH_INTERVAL = 10
+
+VIEW_FLUSH_SIZE = 300
+
+# Фоновый поток сброса просмотров, стартует в PostsConfig.ready.
+VIEW_FLUSHER = not DEBUG
+
+ARCHIVE_AFTER_DAYS = 365 * 2
+
+ARCHIVE_BATCH_SIZE = 500
+
+ARCHIVE_COUNT_TIMEOUT = 60 * 60 * 24
+
+DELETION_BATCH_SIZE = 200
+
+# За сколько последних дней считаются популярные хештеги.
+TRENDING_DAYS = 7
+
+TRENDING_TAGS = 10
+
+TRENDING_CACHE_TIMEOUT = 60 * 5
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Пользователи кешируются только на общем для воркеров бэкенде кеша.
+USER_CACHE_TIMEOUT = 60 * 15
+
+OBJECT_CACHE_TIMEOUT = 60 * 15
+
+STREAM_PAGES = False
+
+# Запросы дольше стольких миллисекунд пишутся в SLOW_QUERY_LOG
+# с планом и местом вызова; None выключает журнал.
+SLOW_QUERY_MS = 100
+
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+
+SLOW_QUERY_LOG_SIZE = 5 * 1024 * 1024
+
+# Ленивые загрузки связей в цикле: 'raise' - исключение, 'log' -
+# предупреждение в лог core.nplusone, None - не проверять.
+NPLUSONE_MODE = 'raise' if DEBUG else 'log'
+
+# Связи вида 'posts.Post.group', которые разрешено грузить лениво.
+NPLUSONE_ALLOW = ()
+
+# Доля запросов, память которых меряет tracemalloc; 0 - выключено.
+MEMTRACK_SAMPLE_RATE = 0
+
+MEMTRACK_FRAMES = 1
+
+MEMTRACK_TOP_LINES = 10
+
+MEMTRACK_ROOT = os.path.join(BASE_DIR, 'memory_snapshots')
+
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
+
+# Сколько последних профилей хранить на диске.
+PROFILE_KEEP = 50
+
+PROFILE_PARAM = '_profile'
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# Сервер, который прогревает warmup_cache.
+WARMUP_URL = 'http://127.0.0.1:8000'
+
+WARMUP_PAGES = 5
+
+WARMUP_PROFILES = 20
+
+WARMUP_POSTS = 50
+
+# Прогрев не должен отнимать у живого трафика все соединения с базой.
+WARMUP_CONCURRENCY = 4
+
+# Сколько секунд после срока кеш отдает устаревшее значение, пока один
+# воркер пересчитывает его под блокировкой.
+STAMPEDE_STALE_TIMEOUT = 60 * 5
+
+STAMPEDE_LOCK_TIMEOUT = 30
+
+# Сколько секунд ждать чужой пересчет, если устаревшего значения нет.
+STAMPEDE_WAIT = 2
+
+# Агрессивность раннего обновления: больше - обновляет раньше.
+STAMPEDE_BETA = 1.0
+
+# Только для общего кеша: на LocMem страницы для анонимов не кешируются.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+PAGE_CACHE_PARAMS = ('page', 'cursor', 'comments_after')
@@ -3,13 +3,21 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import memory_report, static_asset
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('memory/', memory_report, name='memory_report'),
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
+    path(
+        f'{settings.STATIC_URL.strip("/")}/<path:path>',
+        static_asset,
+        name='static_asset',
+    ),
 ]
 
 if settings.DEBUG: